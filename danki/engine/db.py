@@ -4,9 +4,16 @@ import sqlite3
 import json
 import time
 import uuid
+from contextlib import contextmanager
 from typing import Optional, Any, Dict, List
 from pathlib import Path
 
+# UPDATE ... RETURNING needs SQLite 3.35+
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Learning cards due within this many seconds count as due (one study session)
+SESSION_DURATION = 1800
+
 
 class Database:
     """SQLite database manager for Danki."""
@@ -15,12 +22,24 @@ class Database:
         """Initialize database connection.
         
         Args:
-            path: Path to SQLite database file
+            path: Path to SQLite database file, or a "file:" URI
         """
         self.path = path
-        self._ensure_path_exists()
-        self.conn = sqlite3.connect(path, check_same_thread=False)
+        # "file:" paths are SQLite URIs (e.g. a shared-cache in-memory database)
+        self.uri = path.startswith("file:")
+        # Whether the file held a database before this connection opened it
+        self.existed = False
+        if not self.uri:
+            self._ensure_path_exists()
+            self.existed = path != ":memory:" and Path(path).exists()
+        self.conn = sqlite3.connect(path, check_same_thread=False, uri=self.uri)
         self.conn.row_factory = sqlite3.Row
+        # Parsed deck prefs by deck ID. Deck writes on this connection evict
+        # their entry; commits from other connections clear it all
+        self._prefs_cache: Dict[str, Dict] = {}
+        self._prefs_cache_version = None
+        # Nesting depth of transaction() blocks; commits wait until it is 0
+        self._tx_depth = 0
         self._setup_database()
 
     def _ensure_path_exists(self) -> None:
@@ -31,7 +50,16 @@ class Database:
     def _setup_database(self) -> None:
         """Set up database with WAL mode and create tables."""
         self.conn.execute("PRAGMA journal_mode=WAL")
+        # WAL only needs syncing at checkpoints; NORMAL keeps it crash-safe
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.execute("PRAGMA cache_size=-20000")  # ~20 MB page cache
         self.create_tables()
+        if self.existed:
+            # Analyze any tables whose statistics are missing or stale before
+            # the first queries run (0x10002: allow analysis, on open)
+            self.conn.execute("PRAGMA optimize=0x10002")
 
     def create_tables(self) -> None:
         """Create necessary tables if they don't exist."""
@@ -92,15 +120,61 @@ class Database:
         );
 
         CREATE INDEX IF NOT EXISTS idx_cards_due ON cards(state, due_ts);
+        CREATE INDEX IF NOT EXISTS idx_notes_deck ON notes(deck_id);
+        CREATE INDEX IF NOT EXISTS idx_review_log_card ON review_log(card_id, ts);
         CREATE INDEX IF NOT EXISTS idx_daily_stats ON daily_stats(deck_id, study_date);
         """
         
         self.conn.executescript(schema)
         self.conn.commit()
 
+    def _commit(self) -> None:
+        """Commit, unless inside a transaction() block."""
+        if not self._tx_depth:
+            self.conn.commit()
+
+    @contextmanager
+    def transaction(self):
+        """Group writes into a single commit.
+        
+        Write methods called inside the block skip their own commit; the
+        outermost block commits on success and rolls back on error.
+        Blocks may be nested.
+        """
+        # Open the transaction explicitly rather than at the first write, so
+        # reads at the top of the block see the same snapshot as the writes
+        if not self._tx_depth and not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+        self._tx_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._tx_depth -= 1
+            if not self._tx_depth:
+                self.conn.rollback()
+            raise
+        self._tx_depth -= 1
+        if not self._tx_depth:
+            self.conn.commit()
+
+    def change_token(self) -> tuple:
+        """Return a value that changes whenever the database contents may have.
+        
+        Combines PRAGMA data_version (bumped by commits from other
+        connections) with this connection's total_changes (its own writes).
+        """
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        return (data_version, self.conn.total_changes)
+
     def close(self) -> None:
         """Close database connection."""
         if self.conn:
+            # Refresh planner statistics (e.g. so deck filters use
+            # idx_notes_deck); cheap, and a no-op when nothing changed
+            try:
+                self.conn.execute("PRAGMA optimize")
+            except sqlite3.Error:
+                pass  # already closed, or the database is busy
             self.conn.close()
 
     def create_deck(self, name: str, is_builtin: bool = False, 
@@ -129,7 +203,7 @@ class Database:
             "INSERT INTO decks (id, name, is_builtin, prefs) VALUES (?, ?, ?, ?)",
             (deck_id, name, int(is_builtin), json.dumps(prefs))
         )
-        self.conn.commit()
+        self._commit()
         return deck_id
 
     def get_deck(self, deck_id: str) -> Optional[Dict]:
@@ -202,25 +276,66 @@ class Database:
                 (card_id_2, note_id, "back->front", "new", now_ts)
             )
         
-        self.conn.commit()
+        self._commit()
         return note_id
 
+    def add_notes_bulk(self, deck_id: str, notes: List[tuple]) -> List[str]:
+        """Add many notes to one deck in a single transaction.
+
+        Creates the same card(s) per note as add_note, but with one
+        executemany per table and a single commit.
+
+        Args:
+            deck_id: Target deck ID
+            notes: (front, back, meta) tuples; meta may be None
+
+        Returns:
+            Note IDs in input order
+        """
+        now_ts = int(time.time())
+
+        prefs = self.get_deck_preferences(deck_id)
+        templates = ["front->back"]
+        if prefs.get('bidirectional_cards', True):
+            templates.append("back->front")
+
+        note_rows = []
+        card_rows = []
+        for front, back, meta in notes:
+            note_id = str(uuid.uuid4())
+            note_rows.append(
+                (note_id, deck_id, front, back, json.dumps(meta) if meta else None, now_ts)
+            )
+            for template in templates:
+                card_rows.append((str(uuid.uuid4()), note_id, template, "new", now_ts))
+
+        self.conn.executemany(
+            "INSERT INTO notes (id, deck_id, front, back, meta, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            note_rows
+        )
+        self.conn.executemany(
+            "INSERT INTO cards (id, note_id, template, state, due_ts) VALUES (?, ?, ?, ?, ?)",
+            card_rows
+        )
+
+        self._commit()
+        return [row[0] for row in note_rows]
+
     def get_learning_cards(self, deck_ids: List[str], now_ts: int) -> List[Dict]:
         """Get learning cards due now or within session timeframe (Anki Phase 1)."""
         if not deck_ids:
             return []
             
         deck_placeholders = ",".join("?" for _ in deck_ids)
-        session_duration = 1800  # 30 minutes - include cards due during session
         
         query = f"""
-        SELECT c.*, n.front, n.back, n.meta, d.name as deck_name
+        SELECT c.*, n.deck_id, n.front, n.back, n.meta, d.name as deck_name
         FROM cards c
         JOIN notes n ON c.note_id = n.id  
         JOIN decks d ON n.deck_id = d.id
         WHERE n.deck_id IN ({deck_placeholders})
         AND c.state = 'learning'
-        AND c.due_ts <= ? + {session_duration}
+        AND c.due_ts <= ? + {SESSION_DURATION}
         ORDER BY c.due_ts
         """
         
@@ -236,7 +351,7 @@ class Database:
         limit_clause = f"LIMIT {limit}" if limit else ""
         
         query = f"""
-        SELECT c.*, n.front, n.back, n.meta, d.name as deck_name
+        SELECT c.*, n.deck_id, n.front, n.back, n.meta, d.name as deck_name
         FROM cards c
         JOIN notes n ON c.note_id = n.id  
         JOIN decks d ON n.deck_id = d.id
@@ -259,7 +374,7 @@ class Database:
         limit_clause = f"LIMIT {limit}" if limit else ""
         
         query = f"""
-        SELECT c.*, n.front, n.back, n.meta, d.name as deck_name
+        SELECT c.*, n.deck_id, n.front, n.back, n.meta, d.name as deck_name
         FROM cards c
         JOIN notes n ON c.note_id = n.id  
         JOIN decks d ON n.deck_id = d.id
@@ -271,7 +386,65 @@ class Database:
         
         rows = self.conn.execute(query, deck_ids).fetchall()
         return self._rows_to_card_dicts(rows)
-    
+
+    def get_card_ids(self, deck_id: str, limit: Optional[int] = None) -> List[str]:
+        """Get the IDs of a deck's cards, without loading note content."""
+        rows = self.conn.execute("""
+            SELECT c.id
+            FROM cards c
+            JOIN notes n ON c.note_id = n.id
+            WHERE n.deck_id = ?
+            ORDER BY c.id
+            LIMIT ?
+        """, (deck_id, limit if limit is not None else -1)).fetchall()
+        return [row[0] for row in rows]
+
+    def get_queue_buckets(self, deck_ids: List[str], now_ts: int,
+                          review_limit: Optional[int] = None,
+                          new_limit: Optional[int] = None) -> Dict[str, List[Dict]]:
+        """Get learning, review and new cards in one query (Anki Phases 1-3).
+
+        Returns the same lists as get_learning_cards, get_review_cards and
+        get_new_cards, keyed 'learning', 'review' and 'new'.
+        """
+        buckets = {"learning": [], "review": [], "new": []}
+        if not deck_ids:
+            return buckets
+
+        deck_placeholders = ",".join("?" for _ in deck_ids)
+
+        # Each branch keeps its own order and limit; a negative LIMIT means none
+        select = f"""
+            SELECT '{{bucket}}' AS bucket, c.*, n.deck_id, n.front, n.back, n.meta, d.name as deck_name
+            FROM cards c
+            JOIN notes n ON c.note_id = n.id
+            JOIN decks d ON n.deck_id = d.id
+            WHERE n.deck_id IN ({deck_placeholders})
+            AND c.state = '{{bucket}}'
+        """
+        query = f"""
+        SELECT * FROM ({select.format(bucket='learning')}
+            AND c.due_ts <= ? + {SESSION_DURATION}
+            ORDER BY c.due_ts)
+        UNION ALL
+        SELECT * FROM ({select.format(bucket='review')}
+            AND c.due_ts <= ?
+            ORDER BY c.due_ts
+            LIMIT ?)
+        UNION ALL
+        SELECT * FROM ({select.format(bucket='new')}
+            ORDER BY c.id
+            LIMIT ?)
+        """
+        params = (deck_ids + [now_ts]
+                  + deck_ids + [now_ts, review_limit or -1]
+                  + deck_ids + [new_limit or -1])
+
+        rows = self.conn.execute(query, params).fetchall()
+        for bucket, cards in buckets.items():
+            cards.extend(self._rows_to_card_dicts(row for row in rows if row["bucket"] == bucket))
+        return buckets
+
     def _rows_to_card_dicts(self, rows) -> List[Dict]:
         """Convert database rows to card dictionaries."""
         return [{
@@ -287,6 +460,7 @@ class Database:
             "ease": row["ease"],
             "lapses": row["lapses"],
             "step_index": row["step_index"],
+            "deck_id": row["deck_id"],
             "deck_name": row["deck_name"]
         } for row in rows]
 
@@ -300,55 +474,86 @@ class Database:
         deck_placeholders = ",".join("?" for _ in deck_ids)
         
         # Include cards that are due now OR learning cards due within session timeframe
-        session_duration = 1800  # 30 minutes
         query = f"""
-        SELECT c.*, n.front, n.back, n.meta, d.name as deck_name
+        SELECT c.*, n.deck_id, n.front, n.back, n.meta, d.name as deck_name
         FROM cards c
         JOIN notes n ON c.note_id = n.id  
         JOIN decks d ON n.deck_id = d.id
         WHERE n.deck_id IN ({deck_placeholders})
         AND (
             c.due_ts <= ? OR 
-            (c.state = 'learning' AND c.due_ts <= ? + {session_duration})
+            (c.state = 'learning' AND c.due_ts <= ? + {SESSION_DURATION})
         )
         AND c.state != 'suspended'
         ORDER BY c.due_ts
         """
         
         rows = self.conn.execute(query, deck_ids + [now_ts, now_ts]).fetchall()
-        
-        return [{
-            "card_id": row["id"],
-            "note_id": row["note_id"],
-            "template": row["template"],  # Add missing template field!
-            "front": row["front"],
-            "back": row["back"],
-            "meta": json.loads(row["meta"]) if row["meta"] else None,
-            "state": row["state"],
-            "due_ts": row["due_ts"],
-            "interval_days": row["interval_days"],
-            "ease": row["ease"],
-            "lapses": row["lapses"],
-            "step_index": row["step_index"],
-            "deck_name": row["deck_name"]
-        } for row in rows]
+        return self._rows_to_card_dicts(rows)
+
+    def is_card_due(self, card_id: str, now_ts: int) -> bool:
+        """Check whether get_cards_for_review would include a card right now."""
+        row = self.conn.execute(f"""
+            SELECT EXISTS(
+                SELECT 1 FROM cards
+                WHERE id = ?
+                AND (due_ts <= ? OR (state = 'learning' AND due_ts <= ? + {SESSION_DURATION}))
+                AND state != 'suspended'
+            )
+        """, (card_id, now_ts, now_ts)).fetchone()
+        return bool(row[0])
+
+    def get_card(self, card_id: str) -> Optional[Dict]:
+        """Get a card row by ID as a dict (the same columns RETURNING * gives)."""
+        row = self.conn.execute("SELECT * FROM cards WHERE id = ?", (card_id,)).fetchone()
+        return dict(row) if row else None
 
     def update_card_after_review(self, card_id: str, new_state: str, 
                                new_due_ts: int, new_interval: float,
                                new_ease: float, new_lapses: int,
-                               new_step_index: int) -> None:
-        """Update card state after review."""
-        now_ts = int(time.time())
+                               new_step_index: int) -> Optional[Dict]:
+        """Update card state after review.
         
-        self.conn.execute("""
+        Returns:
+            The updated card row as a dict, or None if the card doesn't exist
+        """
+        now_ts = int(time.time())
+        query = """
             UPDATE cards 
             SET state = ?, due_ts = ?, interval_days = ?, ease = ?, 
                 lapses = ?, step_index = ?, last_review_ts = ?
             WHERE id = ?
-        """, (new_state, new_due_ts, new_interval, new_ease, 
-              new_lapses, new_step_index, now_ts, card_id))
+        """
+        params = (new_state, new_due_ts, new_interval, new_ease, 
+                  new_lapses, new_step_index, now_ts, card_id)
         
-        self.conn.commit()
+        if _HAS_RETURNING:
+            rows = self.conn.execute(query + " RETURNING *", params).fetchall()
+            self._commit()
+            return dict(rows[0]) if rows else None
+        
+        self.conn.execute(query, params)
+        self._commit()
+        return self.get_card(card_id)
+
+    def update_cards_after_review(self, rows: List[tuple]) -> None:
+        """Update several cards' states after review at once.
+
+        Args:
+            rows: (card_id, new_state, new_due_ts, new_interval, new_ease,
+                new_lapses, new_step_index) tuples
+        """
+        now_ts = int(time.time())
+
+        self.conn.executemany("""
+            UPDATE cards
+            SET state = ?, due_ts = ?, interval_days = ?, ease = ?,
+                lapses = ?, step_index = ?, last_review_ts = ?
+            WHERE id = ?
+        """, [(state, due_ts, interval, ease, lapses, step_index, now_ts, card_id)
+              for card_id, state, due_ts, interval, ease, lapses, step_index in rows])
+
+        self._commit()
 
     def log_review(self, card_id: str, rating: int, answer_ms: int,
                   prev_state: str, prev_interval: float, 
@@ -362,7 +567,25 @@ class Database:
             VALUES (?, ?, ?, ?, ?, ?, ?)
         """, (card_id, now_ts, rating, answer_ms, prev_state, prev_interval, next_interval))
         
-        self.conn.commit()
+        self._commit()
+
+    def log_reviews(self, rows: List[tuple]) -> None:
+        """Log several reviews at once.
+        
+        Args:
+            rows: (card_id, rating, answer_ms, prev_state, prev_interval,
+                next_interval) tuples
+        """
+        now_ts = int(time.time())
+        
+        self.conn.executemany("""
+            INSERT INTO review_log 
+            (card_id, ts, rating, answer_ms, prev_state, prev_interval, next_interval)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(card_id, now_ts, rating, answer_ms, prev_state, prev_interval, next_interval)
+              for card_id, rating, answer_ms, prev_state, prev_interval, next_interval in rows])
+        
+        self._commit()
 
     def suspend_card(self, card_id: str) -> None:
         """Mark a card as suspended."""
@@ -370,7 +593,7 @@ class Database:
             "UPDATE cards SET state = 'suspended' WHERE id = ?",
             (card_id,)
         )
-        self.conn.commit()
+        self._commit()
 
     def get_stats_today(self, deck_ids: List[str], now_ts: int) -> Dict:
         """Get today's review statistics."""
@@ -449,13 +672,30 @@ class Database:
                        ?)""",
             (deck_id, study_date, deck_id, study_date, new_count, deck_id, study_date, rev_count, int(time.time()))
         )
-        self.conn.commit()
+        self._commit()
 
     def get_deck_preferences(self, deck_id: str) -> Dict:
-        """Get deck preferences."""
+        """Get deck preferences.
+        
+        Parsed prefs are cached per deck. Deck writes on this connection
+        (update_deck_preferences, delete_deck) evict their entry, and the
+        whole cache is dropped once another connection has committed
+        (the data_version part of change_token() moves).
+        """
+        version = self.change_token()[0]
+        if version != self._prefs_cache_version:
+            self._prefs_cache.clear()
+            self._prefs_cache_version = version
+        
+        prefs = self._prefs_cache.get(deck_id)
+        if prefs is not None:
+            return dict(prefs)
+        
         row = self.conn.execute("SELECT prefs FROM decks WHERE id = ?", (deck_id,)).fetchone()
         if row:
-            return json.loads(row["prefs"])
+            prefs = json.loads(row["prefs"])
+            self._prefs_cache[deck_id] = prefs
+            return dict(prefs)
         else:
             # Return default preferences
             return {
@@ -480,4 +720,11 @@ class Database:
             "UPDATE decks SET prefs = ? WHERE id = ?", 
             (json.dumps(current_prefs), deck_id)
         )
-        self.conn.commit()
+        self._commit()
+        self._prefs_cache.pop(deck_id, None)
+
+    def delete_deck(self, deck_id: str) -> None:
+        """Delete a deck by ID."""
+        self.conn.execute("DELETE FROM decks WHERE id = ?", (deck_id,))
+        self._commit()
+        self._prefs_cache.pop(deck_id, None)
@@ -3,9 +3,20 @@
 import time
 import math
 import random
+from collections import deque
 from enum import IntEnum
 from typing import Optional
-from .db import Database
+from .db import Database, SESSION_DURATION
+
+# SM-2+ Configuration (Anki defaults)
+LEARNING_STEPS = (1, 10)         # Learning steps in minutes
+GRADUATING_INTERVAL_GOOD = 1      # Days when graduating with Good
+GRADUATING_INTERVAL_EASY = 4      # Days when graduating with Easy
+STARTING_EASE = 2.5               # Starting ease factor (250%)
+MINIMUM_EASE = 1.3               # Minimum ease factor (130%)
+HARD_MULTIPLIER = 1.2            # Hard answer multiplier
+EASY_MULTIPLIER = 1.3            # Easy answer multiplier
+LAPSE_MULTIPLIER = 0.5           # Interval reduction on lapse
 
 class Rating(IntEnum):
     """Anki-compatible 4-button rating system."""
@@ -19,6 +30,10 @@ class Rating(IntEnum):
     ALMOST = HARD
     GOT_IT = GOOD
 
+# Plain-int ratings for _calculate_next_state; Rating.X goes through the
+# enum metaclass on every lookup, which costs more than the comparison
+_AGAIN, _HARD, _GOOD = int(Rating.AGAIN), int(Rating.HARD), int(Rating.GOOD)
+
 class Scheduler:
     """Enhanced SM-2+ scheduler matching Anki behavior.
     
@@ -31,9 +46,17 @@ class Scheduler:
     - Easy bonus multiplier (1.3)
     """
     
-    def __init__(self, db_path: str):
-        self.db_path = db_path
-        self.db = Database(db_path)
+    def __init__(self, db_path: Optional[str] = None, db: Optional[Database] = None):
+        # Reuse an open Database when given one, so callers that also need
+        # direct DB access share a single connection
+        if db is not None:
+            self.db = db
+            self.db_path = db.path
+        elif db_path is not None:
+            self.db_path = db_path
+            self.db = Database(db_path)
+        else:
+            raise ValueError("Scheduler needs either a db_path or a Database")
 
     def add_note(self, deck_id: str, front: str, back: str, meta: Optional[dict] = None) -> str:
         """Add a note to a deck. Returns the new note ID."""
@@ -67,16 +90,14 @@ class Scheduler:
         
         print(f"📊 Daily limits: {total_new_limit} new, {total_review_limit} review")
         
-        # PHASE 1: Gather learning cards (time-critical, highest priority)
-        learning_cards = self.db.get_learning_cards(deck_ids, now_ts)
+        # PHASES 1-3: Gather learning cards (time-critical, highest priority),
+        # then review and new cards up to the daily limits, in one query
+        buckets = self.db.get_queue_buckets(deck_ids, now_ts, total_review_limit, total_new_limit)
+        learning_cards = buckets['learning']
+        review_cards = buckets['review']
+        new_cards = buckets['new']
         print(f"📚 Learning cards: {len(learning_cards)}")
-        
-        # PHASE 2: Gather review cards (up to daily limit)
-        review_cards = self.db.get_review_cards(deck_ids, now_ts, total_review_limit)
         print(f"🔄 Review cards: {len(review_cards)}")
-        
-        # PHASE 3: Gather new cards (up to daily limit)  
-        new_cards = self.db.get_new_cards(deck_ids, total_new_limit)
         print(f"✨ New cards: {len(new_cards)}")
         
         # PHASE 4: Apply sibling burying during collection
@@ -95,16 +116,25 @@ class Scheduler:
     def build_session(self, deck_ids: list[str], now_ts: Optional[int] = None,
                       max_new: Optional[int] = None, max_rev: Optional[int] = None) -> list[dict]:
         """Return a list of cards for today's session with daily limits."""
+        return list(self.build_session_iter(deck_ids, now_ts, max_new, max_rev))
+
+    def build_session_iter(self, deck_ids: list[str], now_ts: Optional[int] = None,
+                           max_new: Optional[int] = None, max_rev: Optional[int] = None):
+        """Yield today's session cards in order, without building the session list.
+        
+        Same cards and order as build_session(); use it when the caller only
+        needs to scan or count the session.
+        """
         if now_ts is None:
             now_ts = int(time.time())
             
         if not deck_ids:
-            return []
+            return
             
         from ..utils.study_time import study_time
         study_date = study_time.get_study_date(now_ts)
         
-        # Get all due cards
+        # Get all due cards (one query across every deck, deck_id included)
         cards = self.db.get_cards_for_review(deck_ids, now_ts)
         
         # Separate by state
@@ -119,20 +149,14 @@ class Scheduler:
         # Group cards by deck
         cards_by_deck = {}
         for card in new_cards + review_cards:
-            deck_id = card.get('deck_id')
-            if not deck_id:
-                # Get deck_id from note if not directly available
-                note_row = self.db.conn.execute("SELECT deck_id FROM notes WHERE id = ?", (card['note_id'],)).fetchone()
-                deck_id = note_row['deck_id'] if note_row else None
-                
+            deck_id = card['deck_id']
             if deck_id:
                 if deck_id not in cards_by_deck:
                     cards_by_deck[deck_id] = {'new': [], 'review': []}
-                
-                if card in new_cards:
-                    cards_by_deck[deck_id]['new'].append(card)
-                else:
-                    cards_by_deck[deck_id]['review'].append(card)
+
+                # Bucket by state directly; a list membership test here
+                # compares whole card dicts and goes quadratic on big decks
+                cards_by_deck[deck_id][card['state']].append(card)
         
         # Apply daily limits for each deck
         for deck_id, deck_cards in cards_by_deck.items():
@@ -160,20 +184,17 @@ class Scheduler:
         # ANKI-STYLE LEARNING CARD MANAGEMENT
         # Include learning cards that will be due during the session (not just right now)
         # This ensures "Again" cards appear in the session even if due in 1 minute
-        session_duration = 1800  # 30 minutes - typical session length
-        due_learning = [c for c in learning_cards if c['due_ts'] <= now_ts + session_duration]
-        future_learning = [c for c in learning_cards if c['due_ts'] > now_ts + session_duration]
+        due_learning = [c for c in learning_cards if c['due_ts'] <= now_ts + SESSION_DURATION]
+        future_learning = [c for c in learning_cards if c['due_ts'] > now_ts + SESSION_DURATION]
         
         # Build session with proper Anki interleaving:
         # Learning cards are mixed in, not all at front
-        session = self._build_anki_session(
+        yield from self._iter_anki_session(
             due_learning, filtered_new_cards, filtered_review_cards, future_learning
         )
-        
-        return session
     
-    def _build_anki_session(self, learning_cards, new_cards, review_cards, future_learning):
-        """Build session with proper Anki-style card interleaving.
+    def _iter_anki_session(self, learning_cards, new_cards, review_cards, future_learning):
+        """Yield session cards with proper Anki-style card interleaving.
         
         Anki's algorithm:
         - Learning cards appear every ~3-4 cards
@@ -181,51 +202,49 @@ class Scheduler:
         - Review cards fill the gaps
         - Future learning cards added at end
         """
-        session = []
-        
         # Create pools
-        learning_pool = learning_cards.copy()
-        new_pool = new_cards.copy()
-        review_pool = review_cards.copy()
+        learning_pool = deque(learning_cards)
+        new_pool = deque(new_cards)
+        review_pool = deque(review_cards)
         
         # Anki interleaving pattern:
         # Show 1-2 learning cards, then 2-3 other cards, repeat
         cards_since_learning = 0
         learning_interval = 3  # Show learning card every ~3 cards
+        position = 0  # Cards yielded so far
         
         while learning_pool or new_pool or review_pool:
             # Add learning card if due and interval reached
             if learning_pool and cards_since_learning >= learning_interval:
-                session.append(learning_pool.pop(0))
+                yield learning_pool.popleft()
                 cards_since_learning = 0
             
             # Add new card (limited distribution)
-            elif new_pool and len(session) % 4 == 1:  # Every 4th position
-                session.append(new_pool.pop(0))
+            elif new_pool and position % 4 == 1:  # Every 4th position
+                yield new_pool.popleft()
                 cards_since_learning += 1
                 
             # Add review card (fills most slots)
             elif review_pool:
-                session.append(review_pool.pop(0))
+                yield review_pool.popleft()
                 cards_since_learning += 1
                 
             # Fallback: add any remaining card
             elif new_pool:
-                session.append(new_pool.pop(0))
+                yield new_pool.popleft()
                 cards_since_learning += 1
             elif learning_pool:
-                session.append(learning_pool.pop(0))
+                yield learning_pool.popleft()
                 cards_since_learning = 0
             else:
                 break
+            position += 1
         
         # Add future learning cards at end
-        session.extend(future_learning)
-        
-        return session
+        yield from future_learning
 
     def review(self, card_id: str, rating: Rating, answer_ms: int,
-               now_ts: Optional[int] = None) -> None:
+               now_ts: Optional[int] = None) -> Optional[dict]:
         """Record a review result and update card scheduling.
         
         Args:
@@ -233,85 +252,170 @@ class Scheduler:
             rating: Rating.AGAIN/HARD/GOOD/EASY (Anki 4-button system)
             answer_ms: Time taken to answer in milliseconds
             now_ts: Timestamp of review (defaults to now)
+            
+        Returns:
+            The updated card row, or None if the card doesn't exist
         """
         if now_ts is None:
             now_ts = int(time.time())
+        return self.review_batch(card_id, [rating], [answer_ms], [now_ts])
+
+    def review_batch(self, card_id: str, ratings: list[Rating], answer_ms: list[int],
+                     timestamps: Optional[list[int]] = None) -> Optional[dict]:
+        """Record several successive reviews of one card in one transaction.
+        
+        Same result as calling review() once per rating, but the card is
+        read once, only its final state is written back, and the review log
+        rows are inserted with a single executemany.
+        
+        Args:
+            card_id: Card being reviewed
+            ratings: Ratings in review order
+            answer_ms: Answer time in milliseconds for each rating
+            timestamps: Timestamp of each review (defaults to now)
+            
+        Returns:
+            The card row after the last review (unchanged if ratings is
+            empty), or None if the card doesn't exist
+            
+        Raises:
+            ValueError: If answer_ms or timestamps differ in length from ratings
+        """
+        if timestamps is None:
+            timestamps = [int(time.time())] * len(ratings)
+        if not len(ratings) == len(answer_ms) == len(timestamps):
+            raise ValueError(
+                f"ratings, answer_ms and timestamps differ in length "
+                f"({len(ratings)}, {len(answer_ms)}, {len(timestamps)})"
+            )
             
         # Get current card state
         card = self._get_card(card_id)
-        if not card:
-            return
-            
-        prev_state = card['state']
-        prev_interval = card['interval_days']
-        
-        # Calculate new card state based on SM-2
-        new_state, new_due_ts, new_interval, new_ease, new_lapses, new_step_index = \
-            self._calculate_next_state(card, rating, now_ts)
-        
-        # Update card in database
-        self.db.update_card_after_review(
-            card_id, new_state, new_due_ts, new_interval, 
-            new_ease, new_lapses, new_step_index
-        )
+        if not card or not ratings:
+            return card
         
-        # Log the review
-        self.db.log_review(
-            card_id, rating, answer_ms, prev_state, prev_interval, new_interval
-        )
-        
-        # Update daily stats for the deck
         from ..utils.study_time import study_time
-        study_date = study_time.get_study_date(now_ts)
+        
+        log_rows = []
+        daily_counts = {}  # study_date -> [new_count, rev_count]
+        for rating, ms, now_ts in zip(ratings, answer_ms, timestamps):
+            prev_state = card['state']
+            prev_interval = card['interval_days']
+            
+            # Calculate new card state based on SM-2
+            (card['state'], card['due_ts'], card['interval_days'], card['ease'],
+             card['lapses'], card['step_index']) = self._calculate_next_state(card, rating, now_ts)
+            
+            log_rows.append((card_id, rating, ms, prev_state, prev_interval, card['interval_days']))
+            
+            # New cards count as new for daily stats, learning/review as reviews
+            if prev_state == 'new':
+                daily_counts.setdefault(study_time.get_study_date(now_ts), [0, 0])[0] += 1
+            elif prev_state in ['learning', 'review']:
+                daily_counts.setdefault(study_time.get_study_date(now_ts), [0, 0])[1] += 1
         
         # Get deck_id for this card
         note_row = self.db.conn.execute("SELECT deck_id FROM notes WHERE id = ?", (card['note_id'],)).fetchone()
-        if note_row:
-            deck_id = note_row['deck_id']
-            
-            # Determine if this counts as a new card or review for daily stats
-            new_count = 0
-            rev_count = 0
+        
+        with self.db.transaction():
+            updated_card = self.db.update_card_after_review(
+                card_id, card['state'], card['due_ts'], card['interval_days'],
+                card['ease'], card['lapses'], card['step_index']
+            )
+            self.db.log_reviews(log_rows)
             
+            if note_row:
+                for study_date, (new_count, rev_count) in daily_counts.items():
+                    self.db.increment_daily_stats(note_row['deck_id'], study_date, new_count, rev_count)
+        
+        return updated_card
+
+    def review_many(self, items: list[tuple]) -> None:
+        """Record reviews of several cards in one transaction.
+
+        Same result as calling review() for each item in order, but the
+        cards are read with one query and written back, logged and counted
+        with one executemany each. Items for missing cards are skipped.
+
+        Args:
+            items: (card_id, rating, answer_ms, now_ts) tuples; now_ts may be None
+        """
+        if not items:
+            return
+
+        card_ids = list(dict.fromkeys(item[0] for item in items))
+        placeholders = ",".join("?" for _ in card_ids)
+        rows = self.db.conn.execute(f"""
+            SELECT c.*, n.deck_id AS note_deck_id
+            FROM cards c
+            LEFT JOIN notes n ON c.note_id = n.id
+            WHERE c.id IN ({placeholders})
+        """, card_ids).fetchall()
+
+        cards = {}
+        deck_ids = {}
+        for row in rows:
+            card = dict(row)
+            deck_ids[card['id']] = card.pop('note_deck_id')
+            cards[card['id']] = card
+
+        from ..utils.study_time import study_time
+
+        log_rows = []
+        daily_counts = {}  # (deck_id, study_date) -> [new_count, rev_count]
+        for card_id, rating, ms, now_ts in items:
+            card = cards.get(card_id)
+            if card is None:
+                continue
+            if now_ts is None:
+                now_ts = int(time.time())
+            prev_state = card['state']
+            prev_interval = card['interval_days']
+
+            # Calculate new card state based on SM-2
+            (card['state'], card['due_ts'], card['interval_days'], card['ease'],
+             card['lapses'], card['step_index']) = self._calculate_next_state(card, rating, now_ts)
+
+            log_rows.append((card_id, rating, ms, prev_state, prev_interval, card['interval_days']))
+
+            # New cards count as new for daily stats, learning/review as reviews
+            deck_id = deck_ids[card_id]
+            if deck_id is None:
+                continue
             if prev_state == 'new':
-                # This was a new card being studied for first time
-                new_count = 1
+                daily_counts.setdefault((deck_id, study_time.get_study_date(now_ts)), [0, 0])[0] += 1
             elif prev_state in ['learning', 'review']:
-                # This was a review/re-review
-                rev_count = 1
-                
-            # Increment daily stats
-            if new_count > 0 or rev_count > 0:
+                daily_counts.setdefault((deck_id, study_time.get_study_date(now_ts)), [0, 0])[1] += 1
+
+        reviewed = [cards[card_id] for card_id in card_ids if card_id in cards]
+        with self.db.transaction():
+            self.db.update_cards_after_review([
+                (card['id'], card['state'], card['due_ts'], card['interval_days'],
+                 card['ease'], card['lapses'], card['step_index'])
+                for card in reviewed
+            ])
+            self.db.log_reviews(log_rows)
+
+            for (deck_id, study_date), (new_count, rev_count) in daily_counts.items():
                 self.db.increment_daily_stats(deck_id, study_date, new_count, rev_count)
 
     def _get_card(self, card_id: str) -> Optional[dict]:
         """Get card by ID."""
-        cards = self.db.conn.execute(
-            "SELECT * FROM cards WHERE id = ?", (card_id,)
-        ).fetchone()
-        
-        if cards:
-            return dict(cards)
-        return None
+        return self.db.get_card(card_id)
 
-    def _calculate_next_state(self, card: dict, rating: Rating, now_ts: int) -> tuple:
-        """Calculate next card state using SM-2 algorithm."""
+    @classmethod
+    def _calculate_next_state(cls, card: dict, rating: Rating, now_ts: int) -> tuple:
+        """Calculate next card state using SM-2 algorithm.
+        
+        Pure function of its arguments (no database access), so it can be
+        called on the class without opening a Scheduler.
+        """
         current_state = card['state']
         current_ease = card['ease']
         current_interval = card['interval_days']
         current_lapses = card['lapses']
         current_step = card['step_index']
         
-        # SM-2+ Configuration (Anki defaults)
-        LEARNING_STEPS = [1, 10]         # Learning steps in minutes
-        GRADUATING_INTERVAL_GOOD = 1      # Days when graduating with Good
-        GRADUATING_INTERVAL_EASY = 4      # Days when graduating with Easy
-        STARTING_EASE = 2.5               # Starting ease factor (250%)
-        MINIMUM_EASE = 1.3               # Minimum ease factor (130%)
-        HARD_MULTIPLIER = 1.2            # Hard answer multiplier
-        EASY_MULTIPLIER = 1.3            # Easy answer multiplier
-        LAPSE_MULTIPLIER = 0.5           # Interval reduction on lapse
-        
         if current_state == 'new':
             # New card → Learning state transition
             new_state = 'learning'
@@ -319,15 +423,15 @@ class Scheduler:
             new_ease = STARTING_EASE if current_ease == 0 else current_ease
             new_interval = 0
             
-            if rating == Rating.AGAIN:
+            if rating == _AGAIN:
                 # Reset to first step
                 new_step_index = 0
                 new_due_ts = now_ts + (LEARNING_STEPS[0] * 60)
-            elif rating == Rating.HARD:
+            elif rating == _HARD:
                 # Start at first step
                 new_step_index = 0
                 new_due_ts = now_ts + (LEARNING_STEPS[0] * 60)
-            elif rating == Rating.GOOD:
+            elif rating == _GOOD:
                 # Start at first step (normal progression)
                 new_step_index = 0
                 new_due_ts = now_ts + (LEARNING_STEPS[0] * 60)
@@ -335,32 +439,32 @@ class Scheduler:
                 # Graduate immediately with easy interval
                 new_state = 'review'
                 new_step_index = 0
-                new_interval = self._apply_fuzz(GRADUATING_INTERVAL_EASY)
+                new_interval = cls._apply_fuzz(GRADUATING_INTERVAL_EASY)
                 new_due_ts = now_ts + int(new_interval * 24 * 3600)
                 
         elif current_state == 'learning':
             new_ease = current_ease
             new_interval = 0
             
-            if rating == Rating.AGAIN:
+            if rating == _AGAIN:
                 # Reset to first learning step
                 new_state = 'learning'
                 new_step_index = 0
                 new_due_ts = now_ts + (LEARNING_STEPS[0] * 60)
                 new_lapses = current_lapses + 1
-            elif rating == Rating.HARD:
+            elif rating == _HARD:
                 # Repeat current step (minimum 10 minutes)
                 new_state = 'learning'
                 new_step_index = current_step
                 step_minutes = max(10, LEARNING_STEPS[min(current_step, len(LEARNING_STEPS) - 1)])
                 new_due_ts = now_ts + (step_minutes * 60)
                 new_lapses = current_lapses
-            elif rating == Rating.GOOD:
+            elif rating == _GOOD:
                 if current_step >= len(LEARNING_STEPS) - 1:
                     # Graduate to review with standard interval
                     new_state = 'review'
                     new_step_index = 0
-                    new_interval = self._apply_fuzz(GRADUATING_INTERVAL_GOOD)
+                    new_interval = cls._apply_fuzz(GRADUATING_INTERVAL_GOOD)
                     new_due_ts = now_ts + int(new_interval * 24 * 3600)
                     new_lapses = current_lapses
                 else:
@@ -374,7 +478,7 @@ class Scheduler:
                 # Graduate to review with bonus interval
                 new_state = 'review'
                 new_step_index = 0
-                new_interval = self._apply_fuzz(GRADUATING_INTERVAL_EASY)
+                new_interval = cls._apply_fuzz(GRADUATING_INTERVAL_EASY)
                 new_due_ts = now_ts + int(new_interval * 24 * 3600)
                 new_lapses = current_lapses
                     
@@ -385,7 +489,7 @@ class Scheduler:
             # Calculate days late for partial credit
             days_late = max(0, (now_ts - card['due_ts']) / (24 * 3600))
             
-            if rating == Rating.AGAIN:
+            if rating == _AGAIN:
                 # Lapse: transition to relearning
                 new_state = 'learning'  # Relearning uses learning steps
                 new_step_index = 0
@@ -397,11 +501,11 @@ class Scheduler:
                 # Stay in review state
                 new_lapses = current_lapses
                 
-                if rating == Rating.HARD:
+                if rating == _HARD:
                     # Hard: reduce ease and apply hard multiplier
                     new_ease = max(MINIMUM_EASE, current_ease - 0.15)
                     new_interval = max(1.0, current_interval * HARD_MULTIPLIER)
-                elif rating == Rating.GOOD:
+                elif rating == _GOOD:
                     # Good: standard SM-2 with late review credit
                     new_ease = current_ease  # No ease change
                     new_interval = (current_interval + days_late/2) * new_ease
@@ -411,7 +515,7 @@ class Scheduler:
                     new_interval = (current_interval + days_late) * new_ease * EASY_MULTIPLIER
                 
                 # Apply fuzzing and set due date
-                new_interval = self._apply_fuzz(new_interval)
+                new_interval = cls._apply_fuzz(new_interval)
                 new_due_ts = now_ts + int(new_interval * 24 * 3600)
         else:
             # Suspended or unknown state - no changes
@@ -420,7 +524,8 @@ class Scheduler:
         
         return (new_state, new_due_ts, new_interval, new_ease, new_lapses, new_step_index)
     
-    def _apply_fuzz(self, interval: float) -> float:
+    @staticmethod
+    def _apply_fuzz(interval: float) -> float:
         """Apply Anki's interval fuzzing (±5% randomization).
         
         Prevents cards from clustering on the same review day.
@@ -21,7 +21,8 @@ class MainWindow(QMainWindow):
         
         # Initialize database and scheduler
         self.database = Database("danki_data.sqlite")
-        self.scheduler = Scheduler("danki_data.sqlite")
+        # One shared connection, so both see each other's writes (and caches)
+        self.scheduler = Scheduler(db=self.database)
         
         # Create tab widget for main navigation
         self.tab_widget = QTabWidget()
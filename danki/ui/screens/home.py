@@ -329,9 +329,7 @@ class HomeScreen(QWidget):
             
         try:
             # Delete deck (CASCADE will delete cards automatically)
-            cursor = self.database.conn.cursor()
-            cursor.execute("DELETE FROM decks WHERE id = ?", (deck_id,))
-            self.database.conn.commit()
+            self.database.delete_deck(deck_id)
             
             QMessageBox.information(self, "Deleted", f"Deck '{deck_name}' has been deleted.")
             
@@ -23,6 +23,8 @@ class ReviewScreen(QWidget):
         self.current_card = None
         self.card_shown_at = None
         self.is_answer_shown = False
+        self.cards: list = []  # Current session queue
+        self.card_review_sequence: list = []  # Card IDs in the order they were rated
         self.setup_ui()
         self.setup_shortcuts()
         
@@ -175,7 +177,11 @@ class ReviewScreen(QWidget):
             self.show_answer()
             
     def start_review_session(self, cards, deck_ids=None):
-        """Start a review session with the given cards."""
+        """Start a review session with the given cards.
+        
+        The list is kept as-is rather than copied; the screen never mutates
+        it in place (queue updates replace self.cards with a new list).
+        """
         self.cards = cards
         self.current_card_index = 0
         self.current_deck_ids = deck_ids or []  # Track deck for dynamic rebuilding
@@ -8,10 +8,6 @@ import sys
 import time
 import tempfile
 import os
-from pathlib import Path
-
-# Add the project root to Python path
-sys.path.insert(0, str(Path(__file__).parent))
 
 from danki.engine.scheduler import Scheduler, Rating
 from danki.engine.db import Database
@@ -28,9 +24,8 @@ class DatabaseConsistencyTester:
     
     def setup_temp_environment(self):
         """Set up temporary database and scheduler."""
-        temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.sqlite')
-        temp_db.close()
-        self.temp_db_path = temp_db.name
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.temp_db_path = os.path.join(self.temp_dir.name, 'test.sqlite')
         
         self.scheduler = Scheduler(self.temp_db_path)
         self.db = Database(self.temp_db_path)
@@ -44,8 +39,9 @@ class DatabaseConsistencyTester:
             self.scheduler.db.close()
         if self.db:
             self.db.close()
-        if hasattr(self, 'temp_db_path') and os.path.exists(self.temp_db_path):
-            os.unlink(self.temp_db_path)
+        # Removes the database along with any -wal/-shm files beside it
+        if hasattr(self, 'temp_dir'):
+            self.temp_dir.cleanup()
     
     def run_test(self, name, test_func):
         """Run a single test and record results."""
@@ -21,9 +21,8 @@ def debug_again_card_flow():
     print("🔍 Debugging Again Card Flow")
     print("=" * 40)
     
-    temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.sqlite')
-    temp_db.close()
-    temp_db_path = temp_db.name
+    temp_dir = tempfile.TemporaryDirectory()
+    temp_db_path = os.path.join(temp_dir.name, 'debug.sqlite')
     
     try:
         scheduler = Scheduler(temp_db_path)
@@ -124,15 +123,11 @@ def debug_again_card_flow():
         
     finally:
         # Cleanup
-        try:
-            if 'scheduler' in locals():
-                scheduler.db.close()
-            if 'db' in locals():
-                db.close()
-            if os.path.exists(temp_db_path):
-                os.unlink(temp_db_path)
-        except:
-            pass
+        if 'scheduler' in locals():
+            scheduler.db.close()
+        if 'db' in locals():
+            db.close()
+        temp_dir.cleanup()
 
 
 if __name__ == "__main__":
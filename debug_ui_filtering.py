@@ -76,9 +76,8 @@ def test_ui_filtering_logic():
     print("🔍 Testing UI Filtering Logic")
     print("=" * 35)
     
-    temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.sqlite')
-    temp_db.close()
-    temp_db_path = temp_db.name
+    temp_dir = tempfile.TemporaryDirectory()
+    temp_db_path = os.path.join(temp_dir.name, 'debug.sqlite')
     
     try:
         scheduler = Scheduler(temp_db_path)
@@ -132,15 +131,11 @@ def test_ui_filtering_logic():
         return False
         
     finally:
-        try:
-            if 'scheduler' in locals():
-                scheduler.db.close()
-            if 'db' in locals():
-                db.close()
-            if os.path.exists(temp_db_path):
-                os.unlink(temp_db_path)
-        except:
-            pass
+        if 'scheduler' in locals():
+            scheduler.db.close()
+        if 'db' in locals():
+            db.close()
+        temp_dir.cleanup()
 
 
 if __name__ == "__main__":
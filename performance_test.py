@@ -5,33 +5,52 @@ Tests large deck performance, extreme scenarios, and edge cases.
 """
 
 import sys
+import io
+import math
 import time
 import tempfile
 import os
-from pathlib import Path
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
 import random
-
-# Add the project root to Python path
-sys.path.insert(0, str(Path(__file__).parent))
+import sqlite3
 
 from danki.engine.scheduler import Scheduler, Rating
 from danki.engine.db import Database
 
+# UPDATE ... RETURNING needs SQLite 3.35+
+SQLITE_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
 
 class PerformanceTester:
     """Test scheduler performance and edge cases."""
     
-    def __init__(self):
+    # (display name, method name) - each runs against its own database
+    TESTS = [
+        ("Large deck session building", "test_large_deck_session_building"),
+        ("Extreme intervals", "test_extreme_intervals"),
+        ("Minimum ease boundary", "test_minimum_ease_boundary"),
+        ("Rapid successive reviews", "test_rapid_successive_reviews"),
+        ("Memory usage with large sessions", "test_memory_usage_with_large_sessions"),
+        ("Concurrent deck operations", "test_concurrent_deck_operations"),
+    ]
+    
+    def __init__(self, with_database=True):
         self.scheduler = None
         self.db = None
         self.test_results = []
-        self.setup_temp_environment()
+        # The runner in the parent process only collects results; each
+        # worker builds its own tester and database
+        if with_database:
+            self.setup_temp_environment()
     
     def setup_temp_environment(self):
         """Set up temporary database and scheduler."""
-        temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.sqlite')
-        temp_db.close()
-        self.temp_db_path = temp_db.name
+        # Keep the throwaway database in RAM where tmpfs is available
+        self.temp_dir = tempfile.TemporaryDirectory(
+            dir='/dev/shm' if os.path.isdir('/dev/shm') else None
+        )
+        self.temp_db_path = os.path.join(self.temp_dir.name, 'test.sqlite')
         
         self.scheduler = Scheduler(self.temp_db_path)
         self.db = Database(self.temp_db_path)
@@ -45,43 +64,49 @@ class PerformanceTester:
             self.scheduler.db.close()
         if self.db:
             self.db.close()
-        if hasattr(self, 'temp_db_path') and os.path.exists(self.temp_db_path):
-            os.unlink(self.temp_db_path)
+        # Removes the database along with any -wal/-shm files beside it
+        if hasattr(self, 'temp_dir'):
+            self.temp_dir.cleanup()
     
     def run_test(self, name, test_func):
         """Run a single test and record results."""
+        start_time = time.perf_counter()
         try:
             print(f"\n🧪 {name}")
             print("-" * 50)
-            start_time = time.time()
             test_func()
-            duration = time.time() - start_time
+            duration = time.perf_counter() - start_time
             result = f"✅ PASS: {name} ({duration:.2f}s)"
             self.test_results.append(('PASS', name, duration))
         except Exception as e:
-            duration = time.time() - start_time if 'start_time' in locals() else 0
+            duration = time.perf_counter() - start_time
             result = f"❌ FAIL: {name} - {str(e)} ({duration:.2f}s)"
             self.test_results.append(('FAIL', name, str(e)))
         
         print(result)
         return result
     
+    def add_notes_get_card_ids(self, deck_id, notes):
+        """Bulk-insert notes and return one card ID per note, in order."""
+        note_ids = self.db.add_notes_bulk(deck_id, notes)
+        
+        placeholders = ",".join("?" for _ in note_ids)
+        rows = self.db.conn.execute(
+            f"SELECT id, note_id FROM cards WHERE template = 'front->back' AND note_id IN ({placeholders})",
+            note_ids
+        ).fetchall()
+        card_by_note = {row['note_id']: row['id'] for row in rows}
+        
+        return [card_by_note[note_id] for note_id in note_ids]
+    
     def create_bulk_cards(self, count):
         """Create multiple test cards quickly."""
-        card_ids = []
-        for i in range(count):
-            note_id = self.db.add_note(
-                self.test_deck_id, 
-                f"word_{i:04d}", 
-                f"meaning_{i:04d}"
-            )
-            # Get card ID
-            card = self.db.conn.execute(
-                "SELECT id FROM cards WHERE note_id = ?", (note_id,)
-            ).fetchone()
-            card_ids.append(card['id'])
-        
-        return card_ids
+        # Building the row tuples is a few ms even at 5000 cards; the time
+        # goes to ID generation and the inserts, so this stays single-threaded
+        return self.add_notes_get_card_ids(
+            self.test_deck_id,
+            [(f"word_{i:04d}", f"meaning_{i:04d}", None) for i in range(count)]
+        )
     
     def test_large_deck_session_building(self):
         """Test session building performance with large deck."""
@@ -92,17 +117,18 @@ class PerformanceTester:
         
         # Test session building performance
         print("Building session...")
-        start_time = time.time()
-        session = self.scheduler.build_session([self.test_deck_id], int(time.time()))
-        build_time = time.time() - start_time
+        now = int(time.time())
+        start_time = time.perf_counter()
+        session_size = sum(1 for _ in self.scheduler.build_session_iter([self.test_deck_id], now))
+        build_time = time.perf_counter() - start_time
         
-        print(f"Built session with {len(session)} cards in {build_time:.3f}s")
+        print(f"Built session with {session_size} cards in {build_time:.3f}s")
         
         # Should be fast (< 1 second for 1000 cards)
         assert build_time < 1.0, f"Session building too slow: {build_time:.3f}s"
         
         # Should include all new cards (they're all due)
-        assert len(session) == 1000, f"Expected 1000 cards, got {len(session)}"
+        assert session_size == 1000, f"Expected 1000 cards, got {session_size}"
         
         print("✅ Large deck session building performance OK")
     
@@ -116,32 +142,32 @@ class PerformanceTester:
             "SELECT id FROM cards WHERE note_id = ?", (note_id,)
         ).fetchone()
         card_id = card['id']
+        now = int(time.time())
         
         # Set extremely high interval and ease
         self.db.conn.execute("""
             UPDATE cards 
             SET state = 'review', interval_days = 10000.0, ease = 5.0, due_ts = ?
             WHERE id = ?
-        """, (int(time.time()), card_id))
+        """, (now, card_id))
         self.db.conn.commit()
         
         print("Testing with extreme interval (10000 days) and ease (5.0)...")
         
         # Rate as GOT_IT
-        self.scheduler.review(card_id, Rating.GOOD, 3000, int(time.time()))
+        self.scheduler.review(card_id, Rating.GOOD, 3000, now)
         
         # Check result
         updated_card = self.db.conn.execute(
-            "SELECT * FROM cards WHERE id = ?", (card_id,)
+            "SELECT interval_days FROM cards WHERE id = ?", (card_id,)
         ).fetchone()
         
         new_interval = updated_card['interval_days']
         print(f"New interval: {new_interval} days ({new_interval/365.25:.1f} years)")
         
-        # Should be reasonable (not infinite or negative)
-        assert new_interval > 0, "Interval should be positive"
-        assert new_interval < 100000, "Interval should not be excessively large"
-        assert not (new_interval != new_interval), "Interval should not be NaN"  # NaN check
+        # Should be reasonable (finite, positive, not excessively large)
+        assert math.isfinite(new_interval) and 0 < new_interval < 100000, \
+            f"Interval out of range: {new_interval}"
         
         print("✅ Extreme intervals handled correctly")
     
@@ -155,33 +181,43 @@ class PerformanceTester:
             "SELECT id FROM cards WHERE note_id = ?", (note_id,)
         ).fetchone()
         card_id = card['id']
+        now = int(time.time())
         
         # Set ease to 1.31 (just above floor)
         self.db.conn.execute("""
             UPDATE cards 
             SET state = 'review', interval_days = 5.0, ease = 1.31, due_ts = ?
             WHERE id = ?
-        """, (int(time.time()), card_id))
+        """, (now, card_id))
         self.db.conn.commit()
         
         print("Starting with ease = 1.31 (just above floor)")
         
         # Rate as MISSED multiple times
         for i in range(5):
-            self.scheduler.review(card_id, Rating.AGAIN, 5000, int(time.time()))
-            card = self.db.conn.execute("SELECT * FROM cards WHERE id = ?", (card_id,)).fetchone()
-            print(f"After lapse {i+1}: ease = {card['ease']}")
+            self.scheduler.review(card_id, Rating.AGAIN, 5000, now)
             
-            # Should never go below 1.3
-            assert card['ease'] >= 1.3, f"Ease below floor: {card['ease']}"
-            
-            # Reset to review state for next test
-            self.db.conn.execute("""
-                UPDATE cards 
-                SET state = 'review', interval_days = 5.0, due_ts = ?
-                WHERE id = ?
-            """, (int(time.time()), card_id))
+            # Reset to review state for next test; the reset leaves ease
+            # alone, so it can hand back the post-lapse ease directly
+            if SQLITE_HAS_RETURNING:
+                (ease,), = self.db.conn.execute("""
+                    UPDATE cards 
+                    SET state = 'review', interval_days = 5.0, due_ts = ?
+                    WHERE id = ?
+                    RETURNING ease
+                """, (now, card_id)).fetchall()
+            else:
+                ease, = self.db.conn.execute("SELECT ease FROM cards WHERE id = ?", (card_id,)).fetchone()
+                self.db.conn.execute("""
+                    UPDATE cards 
+                    SET state = 'review', interval_days = 5.0, due_ts = ?
+                    WHERE id = ?
+                """, (now, card_id))
             self.db.conn.commit()
+            print(f"After lapse {i+1}: ease = {ease}")
+            
+            # Should never go below 1.3
+            assert ease >= 1.3, f"Ease below floor: {ease}"
         
         print("✅ Ease floor enforcement verified")
     
@@ -200,26 +236,27 @@ class PerformanceTester:
         
         # Perform 10 rapid reviews
         print("Performing 10 rapid reviews...")
-        for i in range(10):
-            rating = random.choice([Rating.HARD, Rating.GOOD])
-            self.scheduler.review(card_id, rating, 1000 + i * 100, now + i)
+        ratings = [random.choice([Rating.HARD, Rating.GOOD]) for _ in range(10)]
+        self.scheduler.review_batch(card_id, ratings,
+                                    [1000 + i * 100 for i in range(10)],
+                                    [now + i for i in range(10)])
         
         # Check that all reviews were logged
-        log_count = self.db.conn.execute(
-            "SELECT COUNT(*) as count FROM review_log WHERE card_id = ?", (card_id,)
-        ).fetchone()['count']
+        log_count, = self.db.conn.execute(
+            "SELECT COUNT(*) FROM review_log WHERE card_id = ?", (card_id,)
+        ).fetchone()
         
         assert log_count == 10, f"Expected 10 log entries, got {log_count}"
         
         # Check that card is in valid state
-        final_card = self.db.conn.execute(
-            "SELECT * FROM cards WHERE id = ?", (card_id,)
+        state, ease = self.db.conn.execute(
+            "SELECT state, ease FROM cards WHERE id = ?", (card_id,)
         ).fetchone()
         
-        assert final_card['state'] in ['new', 'learning', 'review'], f"Invalid final state: {final_card['state']}"
-        assert final_card['ease'] >= 1.3, f"Ease below floor: {final_card['ease']}"
+        assert state in ['new', 'learning', 'review'], f"Invalid final state: {state}"
+        assert ease >= 1.3, f"Ease below floor: {ease}"
         
-        print(f"Final state: {final_card['state']}, ease: {final_card['ease']}")
+        print(f"Final state: {state}, ease: {ease}")
         print("✅ Rapid successive reviews handled correctly")
     
     def test_memory_usage_with_large_sessions(self):
@@ -233,8 +270,9 @@ class PerformanceTester:
         # Build multiple sessions
         print("Building 10 sessions...")
         sessions = []
+        now = int(time.time())
         for i in range(10):
-            session = self.scheduler.build_session([self.test_deck_id], int(time.time()))
+            session = self.scheduler.build_session([self.test_deck_id], now)
             sessions.append(session)
         
         print(f"Built {len(sessions)} sessions, each with {len(sessions[0])} cards")
@@ -253,33 +291,24 @@ class PerformanceTester:
         deck2_id = self.db.create_deck("Deck 2")
         deck3_id = self.db.create_deck("Deck 3")
         
-        # Add cards to different decks
-        cards_deck1 = []
-        cards_deck2 = []
-        cards_deck3 = []
-        
-        for i in range(100):
-            # Deck 1
-            note_id = self.db.add_note(self.test_deck_id, f"d1_word_{i}", f"d1_meaning_{i}")
-            card = self.db.conn.execute("SELECT id FROM cards WHERE note_id = ?", (note_id,)).fetchone()
-            cards_deck1.append(card['id'])
-            
-            # Deck 2
-            note_id = self.db.add_note(deck2_id, f"d2_word_{i}", f"d2_meaning_{i}")
-            card = self.db.conn.execute("SELECT id FROM cards WHERE note_id = ?", (note_id,)).fetchone()
-            cards_deck2.append(card['id'])
-            
-            # Deck 3
-            note_id = self.db.add_note(deck3_id, f"d3_word_{i}", f"d3_meaning_{i}")
-            card = self.db.conn.execute("SELECT id FROM cards WHERE note_id = ?", (note_id,)).fetchone()
-            cards_deck3.append(card['id'])
+        # Add cards to different decks (one batch per deck)
+        cards_deck1 = self.add_notes_get_card_ids(
+            self.test_deck_id, [(f"d1_word_{i}", f"d1_meaning_{i}", None) for i in range(100)]
+        )
+        cards_deck2 = self.add_notes_get_card_ids(
+            deck2_id, [(f"d2_word_{i}", f"d2_meaning_{i}", None) for i in range(100)]
+        )
+        cards_deck3 = self.add_notes_get_card_ids(
+            deck3_id, [(f"d3_word_{i}", f"d3_meaning_{i}", None) for i in range(100)]
+        )
         
         print(f"Created 100 cards in each of 3 decks")
         
         # Build sessions for different deck combinations
-        session_deck1 = self.scheduler.build_session([self.test_deck_id], int(time.time()))
-        session_deck2 = self.scheduler.build_session([deck2_id], int(time.time()))
-        session_all = self.scheduler.build_session([self.test_deck_id, deck2_id, deck3_id], int(time.time()))
+        now = int(time.time())
+        session_deck1 = self.scheduler.build_session([self.test_deck_id], now)
+        session_deck2 = self.scheduler.build_session([deck2_id], now)
+        session_all = self.scheduler.build_session([self.test_deck_id, deck2_id, deck3_id], now)
         
         print(f"Deck 1 session: {len(session_deck1)} cards")
         print(f"Deck 2 session: {len(session_deck2)} cards")
@@ -304,12 +333,16 @@ class PerformanceTester:
         print("🧪 Running Performance and Edge Case Tests")
         print("=" * 60)
         
-        self.run_test("Large deck session building", self.test_large_deck_session_building)
-        self.run_test("Extreme intervals", self.test_extreme_intervals)
-        self.run_test("Minimum ease boundary", self.test_minimum_ease_boundary)
-        self.run_test("Rapid successive reviews", self.test_rapid_successive_reviews)
-        self.run_test("Memory usage with large sessions", self.test_memory_usage_with_large_sessions)
-        self.run_test("Concurrent deck operations", self.test_concurrent_deck_operations)
+        # Tests are independent, so run each in its own process and print
+        # their captured output in the original order
+        workers = min(len(self.TESTS), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_isolated_test, name, method_name)
+                       for name, method_name in self.TESTS]
+            for future in futures:
+                result, output = future.result()
+                print(output, end="")
+                self.test_results.append(result)
         
         print("\n" + "=" * 60)
         
@@ -341,15 +374,25 @@ class PerformanceTester:
         return passed, failed, self.test_results
 
 
-def main():
-    """Run the performance test suite."""
+def run_isolated_test(name, method_name):
+    """Run one test on a fresh tester; returns (result tuple, captured output)."""
     tester = PerformanceTester()
+    output = io.StringIO()
     
     try:
-        passed, failed, results = tester.run_all_tests()
-        return failed == 0
+        with contextlib.redirect_stdout(output):
+            tester.run_test(name, getattr(tester, method_name))
     finally:
         tester.cleanup()
+    
+    return tester.test_results[0], output.getvalue()
+
+
+def main():
+    """Run the performance test suite."""
+    tester = PerformanceTester(with_database=False)
+    passed, failed, results = tester.run_all_tests()
+    return failed == 0
 
 
 if __name__ == "__main__":
@@ -5,18 +5,21 @@ Tests real-world scenarios with time progression and database operations.
 """
 
 import sys
-import time
-import tempfile
+import io
 import os
-from pathlib import Path
-from datetime import datetime, timedelta
-
-# Add the project root to Python path
-sys.path.insert(0, str(Path(__file__).parent))
+import time
+import contextlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 
 from danki.engine.scheduler import Scheduler, Rating
 from danki.engine.db import Database
 
+# Expected SM-2 behaviour for on-time Good reviews at the starting ease
+EXPECTED_EASE = 2.5
+GROWTH_RATIO_RANGE = (2.0, 3.0)
+FUZZ_RANGE = (0.95, 1.05)  # Scheduler._apply_fuzz bounds
+
 
 class TimeSimulator:
     """Simulates time progression for testing scheduler behavior."""
@@ -45,24 +48,48 @@ class TimeSimulator:
         """Format timestamp for display."""
         if timestamp is None:
             timestamp = self.current_time
-        return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
 
 
 class SchedulerIntegrationTester:
     """Integration tests for scheduler with real database operations."""
     
-    def __init__(self):
+    # (display name, method name) in run order
+    TESTS = [
+        ("New card learning progression", "test_new_card_learning_progression"),
+        ("Review interval growth", "test_review_interval_growth"),
+        ("Lapse and recovery", "test_lapse_and_recovery"),
+        ("Mixed session building", "test_mixed_session_building"),
+        ("Daily limits", "test_daily_limits"),
+    ]
+    
+    def __init__(self, with_database=True):
         self.time_sim = TimeSimulator()
         self.scheduler = None
         self.db = None
-        self.test_results = []
-        self.setup_temp_environment()
+        # One slot per test, filled in run order by record_result()
+        self.test_results = [None] * len(self.TESTS)
+        self._result_count = 0
+        # Progress detail is only worth formatting for someone watching
+        self.verbose = sys.stdout.isatty()
+        # Set when the environment itself is broken; remaining tests are skipped
+        self.abort_remaining = False
+        self.abort_reason = None
+        # The runner in the parent process only dispatches tests and records
+        # results; each worker builds its own tester and database
+        if not with_database:
+            return
+        try:
+            self.setup_temp_environment()
+        except Exception as e:
+            self.abort_remaining = True
+            self.abort_reason = f"setup failed: {e}"
     
     def setup_temp_environment(self):
         """Set up temporary database and scheduler."""
-        temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.sqlite')
-        temp_db.close()
-        self.temp_db_path = temp_db.name
+        # Shared-cache in-memory database: both connections see the same data,
+        # nothing touches disk, and it disappears when the last one closes
+        self.temp_db_path = f"file:dankitest_{id(self)}?mode=memory&cache=shared"
         
         self.scheduler = Scheduler(self.temp_db_path)
         self.db = Database(self.temp_db_path)
@@ -71,13 +98,11 @@ class SchedulerIntegrationTester:
         self.test_deck_id = self.db.create_deck("Test Deck")
     
     def cleanup(self):
-        """Clean up temporary files."""
+        """Close both connections, which drops the in-memory database."""
         if self.scheduler:
             self.scheduler.db.close()
         if self.db:
             self.db.close()
-        if hasattr(self, 'temp_db_path') and os.path.exists(self.temp_db_path):
-            os.unlink(self.temp_db_path)
     
     def create_test_card(self, front="test", back="test", meta=None):
         """Create a test card and return its ID."""
@@ -90,45 +115,90 @@ class SchedulerIntegrationTester:
         
         return card['id'] if card else None
     
-    def get_card_state(self, card_id):
-        """Get current card state from database."""
-        card = self.db.conn.execute(
-            "SELECT * FROM cards WHERE id = ?", (card_id,)
+    def create_test_cards_bulk(self, pairs):
+        """Create test cards from (front, back) pairs in one transaction.
+        
+        Returns the card IDs in the same order as the pairs.
+        """
+        note_ids = self.db.add_notes_bulk(
+            self.test_deck_id, [(front, back, None) for front, back in pairs]
+        )
+        
+        # One lookup for all the notes' front->back cards
+        placeholders = ",".join("?" for _ in note_ids)
+        rows = self.db.conn.execute(
+            f"SELECT id, note_id FROM cards WHERE template = 'front->back' AND note_id IN ({placeholders})",
+            note_ids
+        ).fetchall()
+        card_by_note = {row['note_id']: row['id'] for row in rows}
+        
+        return [card_by_note[note_id] for note_id in note_ids]
+    
+    def apply_sql(self, *statements):
+        """Run (sql, params) statements against the test DB as one transaction."""
+        with self.db.transaction():
+            for sql, params in statements:
+                self.db.conn.execute(sql, params)
+    
+    def get_card_state(self, card_id, *columns):
+        """Get current card state from database (a sqlite3.Row, or None).
+        
+        Pass column names to fetch only those; all columns by default.
+        """
+        return self.db.conn.execute(
+            f"SELECT {', '.join(columns) or '*'} FROM cards WHERE id = ?", (card_id,)
         ).fetchone()
-        return dict(card) if card else None
     
     def run_test(self, name, test_func):
         """Run a single test and record results."""
+        if self.abort_remaining:
+            result = f"⏭️  SKIP: {name} - {self.abort_reason}"
+            self.record_result(('SKIP', name, self.abort_reason))
+            print(result)
+            return result
+        
+        # Collect the test's output and write it out in one go
+        output = io.StringIO()
         try:
-            print(f"\n🧪 {name}")
-            print("-" * 60)
-            test_func()
+            with contextlib.redirect_stdout(output):
+                if self.verbose:
+                    print(f"\n🧪 {name}")
+                    print("-" * 60)
+                test_func()
             result = f"✅ PASS: {name}"
-            self.test_results.append(('PASS', name, None))
+            self.record_result(('PASS', name, None))
         except Exception as e:
             result = f"❌ FAIL: {name} - {str(e)}"
-            self.test_results.append(('FAIL', name, str(e)))
+            self.record_result(('FAIL', name, str(e)))
         
-        print(result)
+        output.write(f"{result}\n")
+        sys.stdout.write(output.getvalue())
         return result
     
+    def record_result(self, result):
+        """Store a (status, name, detail) result in the next slot."""
+        self.test_results[self._result_count] = result
+        self._result_count += 1
+    
     def test_new_card_learning_progression(self):
         """Test a new card's progression through learning steps."""
         print("Creating new card...")
         card_id = self.create_test_card("Hund", "dog")
         
         # Initial state
-        card = self.get_card_state(card_id)
-        print(f"Initial: {card['state']}, due in {card['due_ts'] - self.time_sim.get_time()}s")
+        now = self.time_sim.get_time()
+        card = self.get_card_state(card_id, 'state', 'due_ts')
+        if self.verbose:
+            print(f"Initial: {card['state']}, due in {card['due_ts'] - now}s")
         assert card['state'] == 'new'
         
         # Rate as GOT_IT (should go to learning step 1 = 1 day)
         print("Rating as GOT_IT...")
-        self.scheduler.review(card_id, Rating.GOOD, 5000, self.time_sim.get_time())
+        card = self.scheduler.review(card_id, Rating.GOOD, 5000, now)
         
-        card = self.get_card_state(card_id)
-        expected_due = self.time_sim.get_time() + (1440 * 60)  # 1 day
-        print(f"After rating: {card['state']}, step={card['step_index']}, due in {card['due_ts'] - self.time_sim.get_time()}s")
+        expected_due = now + (1440 * 60)  # 1 day
+        if self.verbose:
+            print(f"After rating: {card['state']}, step={card['step_index']}, due in {card['due_ts'] - now}s")
         
         assert card['state'] == 'learning'
         assert card['step_index'] == 1
@@ -136,20 +206,17 @@ class SchedulerIntegrationTester:
         
         # Advance time to 1 day later
         print("Advancing time by 1 day...")
-        self.time_sim.advance_days(1)
+        now = self.time_sim.advance_days(1)
         
         # Card should be available for review
-        due_cards = self.db.get_cards_for_review([self.test_deck_id], self.time_sim.get_time())
-        due_card_ids = [c['card_id'] for c in due_cards]
-        print(f"Due cards: {len(due_cards)}")
-        assert card_id in due_card_ids
+        assert self.db.is_card_due(card_id, now)
         
         # Rate as GOT_IT again (should graduate to review)
         print("Rating as GOT_IT (graduation)...")
-        self.scheduler.review(card_id, Rating.GOOD, 3000, self.time_sim.get_time())
+        card = self.scheduler.review(card_id, Rating.GOOD, 3000, now)
         
-        card = self.get_card_state(card_id)
-        print(f"After graduation: {card['state']}, interval={card['interval_days']} days")
+        if self.verbose:
+            print(f"After graduation: {card['state']}, interval={card['interval_days']} days")
         
         assert card['state'] == 'review'
         assert card['interval_days'] == 1.0
@@ -162,41 +229,51 @@ class SchedulerIntegrationTester:
         card_id = self.create_test_card("laufen", "to run")
         
         # Manually set to review state
-        self.db.conn.execute("""
+        self.apply_sql(("""
             UPDATE cards 
             SET state = 'review', interval_days = 1.0, ease = 2.5, due_ts = ?
             WHERE id = ?
-        """, (self.time_sim.get_time(), card_id))
-        self.db.conn.commit()
+        """, (self.time_sim.get_time(), card_id)))
         
         intervals = [1.0]  # Starting interval
         
         # Simulate several successful reviews
         for i in range(5):
-            print(f"Review {i+1}: Current interval = {intervals[-1]} days")
+            if self.verbose:
+                print(f"Review {i+1}: Current interval = {intervals[-1]} days")
             
             # Rate as GOT_IT
-            self.scheduler.review(card_id, Rating.GOOD, 4000, self.time_sim.get_time())
-            
-            card = self.get_card_state(card_id)
+            card = self.scheduler.review(card_id, Rating.GOOD, 4000, self.time_sim.get_time())
             new_interval = card['interval_days']
             intervals.append(new_interval)
             
-            print(f"  → New interval = {new_interval} days")
+            if self.verbose:
+                print(f"  → New interval = {new_interval} days")
             
             # Advance time to next review
             self.time_sim.advance_days(int(new_interval))
         
-        print(f"Interval progression: {intervals}")
+        if self.verbose:
+            print(f"Interval progression: {intervals}")
         
         # Check that intervals are growing (SM-2 behavior)
-        for i in range(1, len(intervals)):
-            assert intervals[i] > intervals[i-1], f"Interval should grow: {intervals[i-1]} -> {intervals[i]}"
+        steps = list(zip(intervals, intervals[1:]))
+        for prev, cur in steps:
+            assert cur > prev, f"Interval should grow: {prev} -> {cur}"
         
         # Check approximate SM-2 growth (each should be ~2.5x previous)
-        for i in range(1, min(3, len(intervals))):
-            ratio = intervals[i] / intervals[i-1]
-            assert 2.0 < ratio < 3.0, f"Growth ratio should be ~2.5, got {ratio}"
+        min_ratio, max_ratio = GROWTH_RATIO_RANGE
+        for prev, cur in steps[:2]:
+            ratio = cur / prev
+            assert min_ratio < ratio < max_ratio, f"Growth ratio should be ~2.5, got {ratio}"
+        
+        # Each review multiplies by the ease and one fuzz factor, so the n-th
+        # interval must sit inside the compounded fuzz envelope around ease**n
+        min_fuzz, max_fuzz = FUZZ_RANGE
+        for n, interval in enumerate(intervals[1:], start=1):
+            expected = EXPECTED_EASE ** n
+            assert expected * min_fuzz ** n <= interval <= expected * max_fuzz ** n, \
+                f"Interval {n} should be ~{expected:.1f} days, got {interval}"
         
         print("✅ Interval growth test complete")
     
@@ -206,21 +283,20 @@ class SchedulerIntegrationTester:
         card_id = self.create_test_card("schwierig", "difficult")
         
         # Set to review with good interval
-        self.db.conn.execute("""
+        now = self.time_sim.get_time()
+        self.apply_sql(("""
             UPDATE cards 
             SET state = 'review', interval_days = 10.0, ease = 2.5, due_ts = ?
             WHERE id = ?
-        """, (self.time_sim.get_time(), card_id))
-        self.db.conn.commit()
+        """, (now, card_id)))
         
-        original_card = self.get_card_state(card_id)
+        original_card = self.get_card_state(card_id, 'interval_days', 'ease', 'lapses')
         print(f"Initial: interval={original_card['interval_days']}, ease={original_card['ease']}")
         
         # Rate as MISSED (lapse)
         print("Rating as MISSED (lapse)...")
-        self.scheduler.review(card_id, Rating.AGAIN, 8000, self.time_sim.get_time())
+        card = self.scheduler.review(card_id, Rating.AGAIN, 8000, now)
         
-        card = self.get_card_state(card_id)
         print(f"After lapse: state={card['state']}, ease={card['ease']}, lapses={card['lapses']}")
         
         assert card['state'] == 'learning'  # Should go back to learning
@@ -230,14 +306,13 @@ class SchedulerIntegrationTester:
         
         # Advance time and re-learn
         print("Re-learning the card...")
-        self.time_sim.advance_minutes(10)  # First learning step
+        now = self.time_sim.advance_minutes(10)  # First learning step
         
         # Rate learning steps as GOT_IT
-        self.scheduler.review(card_id, Rating.GOOD, 3000, self.time_sim.get_time())
-        self.time_sim.advance_days(1)  # Second learning step
-        self.scheduler.review(card_id, Rating.GOOD, 2000, self.time_sim.get_time())
+        self.scheduler.review(card_id, Rating.GOOD, 3000, now)
+        now = self.time_sim.advance_days(1)  # Second learning step
+        recovered_card = self.scheduler.review(card_id, Rating.GOOD, 2000, now)
         
-        recovered_card = self.get_card_state(card_id)
         print(f"After recovery: state={recovered_card['state']}, interval={recovered_card['interval_days']}")
         
         assert recovered_card['state'] == 'review'  # Should be back in review
@@ -250,29 +325,27 @@ class SchedulerIntegrationTester:
         print("Creating cards in different states...")
         
         # Create multiple cards
-        new_card = self.create_test_card("neu", "new")
-        learning_card = self.create_test_card("lernen", "learning")
-        review_card = self.create_test_card("prüfen", "review")
+        new_card, learning_card, review_card = self.create_test_cards_bulk(
+            [("neu", "new"), ("lernen", "learning"), ("prüfen", "review")]
+        )
         
         # Set up different states
-        # Learning card: due in 10 minutes
-        self.db.conn.execute("""
-            UPDATE cards 
-            SET state = 'learning', step_index = 0, due_ts = ?
-            WHERE id = ?
-        """, (self.time_sim.get_time() + 600, learning_card))
-        
-        # Review card: due now
-        self.db.conn.execute("""
-            UPDATE cards 
-            SET state = 'review', interval_days = 5.0, due_ts = ?
-            WHERE id = ?
-        """, (self.time_sim.get_time(), review_card))
-        
-        self.db.conn.commit()
+        # Fresh cards start at step 0 with interval 0, so those columns can
+        # be written back as-is and one statement covers both cards
+        now = self.time_sim.get_time()
+        updates = [
+            ('learning', 0, 0.0, now + 600, learning_card),  # Learning card: due in 10 minutes
+            ('review', 0, 5.0, now, review_card),             # Review card: due now
+        ]
+        with self.db.transaction():
+            self.db.conn.executemany("""
+                UPDATE cards 
+                SET state = ?, step_index = ?, interval_days = ?, due_ts = ?
+                WHERE id = ?
+            """, updates)
         
         # Build session
-        session = self.scheduler.build_session([self.test_deck_id], self.time_sim.get_time())
+        session = self.scheduler.build_session([self.test_deck_id], now)
         print(f"Built session with {len(session)} cards")
         
         # Debug: Print all cards and their states
@@ -301,9 +374,9 @@ class SchedulerIntegrationTester:
         
         # Advance time to make learning card due
         print("Advancing time to make learning card due...")
-        self.time_sim.advance_minutes(11)
+        now = self.time_sim.advance_minutes(11)
         
-        session = self.scheduler.build_session([self.test_deck_id], self.time_sim.get_time())
+        session = self.scheduler.build_session([self.test_deck_id], now)
         session_ids = [card['card_id'] for card in session]
         states = [card['state'] for card in session]
         
@@ -326,28 +399,26 @@ class SchedulerIntegrationTester:
         print("Creating multiple cards for limit testing...")
         
         # Create 15 new cards
-        new_cards = []
-        for i in range(15):
-            card_id = self.create_test_card(f"wort{i}", f"word{i}")
-            new_cards.append(card_id)
+        new_cards = self.create_test_cards_bulk(
+            [(f"wort{i}", f"word{i}") for i in range(15)]
+        )
         
         # Build session with limits
-        session = self.scheduler.build_session([self.test_deck_id], 
-                                             self.time_sim.get_time(), 
+        now = self.time_sim.get_time()
+        session = self.scheduler.build_session([self.test_deck_id], now,
                                              max_new=5, max_rev=10)
         
-        new_in_session = [card for card in session if card['state'] == 'new']
-        print(f"Session with max_new=5: {len(new_in_session)} new cards")
+        new_in_session = Counter(card['state'] for card in session)['new']
+        print(f"Session with max_new=5: {new_in_session} new cards")
         
-        assert len(new_in_session) <= 5  # Should respect limit
+        assert new_in_session <= 5  # Should respect limit
         
         # Test with no limit
-        session_unlimited = self.scheduler.build_session([self.test_deck_id], 
-                                                       self.time_sim.get_time())
-        new_unlimited = [card for card in session_unlimited if card['state'] == 'new']
-        print(f"Session unlimited: {len(new_unlimited)} new cards")
+        session_unlimited = self.scheduler.build_session([self.test_deck_id], now)
+        new_unlimited = Counter(card['state'] for card in session_unlimited)['new']
+        print(f"Session unlimited: {new_unlimited} new cards")
         
-        assert len(new_unlimited) > 5  # Should include more without limit
+        assert new_unlimited > 5  # Should include more without limit
         
         print("✅ Daily limits test complete")
     
@@ -356,38 +427,68 @@ class SchedulerIntegrationTester:
         print("🧪 Running SM-2 Scheduler Integration Tests")
         print("=" * 60)
         
-        self.run_test("New card learning progression", self.test_new_card_learning_progression)
-        self.run_test("Review interval growth", self.test_review_interval_growth)
-        self.run_test("Lapse and recovery", self.test_lapse_and_recovery)
-        self.run_test("Mixed session building", self.test_mixed_session_building)
-        self.run_test("Daily limits", self.test_daily_limits)
+        # Tests are independent, so run each in its own process and print
+        # their captured output in the original order. If this tester could
+        # not even set up, every worker would fail the same way: skip them all.
+        if self.abort_remaining:
+            for name, method_name in self.TESTS:
+                self.run_test(name, getattr(self, method_name))
+        else:
+            workers = min(len(self.TESTS), os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(run_isolated_test, name, method_name)
+                           for name, method_name in self.TESTS]
+                for (name, method_name), future in zip(self.TESTS, futures):
+                    if future.cancel():
+                        # Not started before a worker hit a setup failure
+                        self.run_test(name, getattr(self, method_name))
+                        continue
+                    result, output = future.result()
+                    print(output, end="")
+                    self.record_result(result)
+                    if result[0] == 'SKIP':
+                        self.abort_remaining = True
+                        self.abort_reason = result[2]
         
         print("\n" + "=" * 60)
         
         # Summary
-        passed = sum(1 for result in self.test_results if result[0] == 'PASS')
-        failed = sum(1 for result in self.test_results if result[0] == 'FAIL')
+        results = self.test_results[:self._result_count]
+        passed = sum(1 for result in results if result[0] == 'PASS')
+        failed = sum(1 for result in results if result[0] == 'FAIL')
+        skipped = sum(1 for result in results if result[0] == 'SKIP')
         
-        print(f"📊 Integration Test Summary: {passed} passed, {failed} failed")
+        print(f"📊 Integration Test Summary: {passed} passed, {failed} failed"
+              + (f", {skipped} skipped" if skipped else ""))
         
         if failed > 0:
             print("\n❌ Failed Tests:")
-            for status, name, error in self.test_results:
+            for status, name, error in results:
                 if status == 'FAIL':
                     print(f"  - {name}: {error}")
         
-        return passed, failed, self.test_results
+        return passed, failed, results
 
 
-def main():
-    """Run the integration test suite."""
+def run_isolated_test(name, method_name):
+    """Run one test on a fresh tester; returns (result tuple, captured output)."""
     tester = SchedulerIntegrationTester()
+    output = io.StringIO()
     
     try:
-        passed, failed, results = tester.run_all_tests()
-        return failed == 0
+        with contextlib.redirect_stdout(output):
+            tester.run_test(name, getattr(tester, method_name))
     finally:
         tester.cleanup()
+    
+    return tester.test_results[0], output.getvalue()
+
+
+def main():
+    """Run the integration test suite."""
+    tester = SchedulerIntegrationTester(with_database=False)
+    passed, failed, results = tester.run_all_tests()
+    return failed == 0 and not tester.abort_remaining
 
 
 if __name__ == "__main__":
@@ -1,14 +1,23 @@
 #!/usr/bin/env python3
-"""Test script to verify Add Cards functionality."""
+"""Test script to verify Add Cards functionality.
+
+Set DANKI_TEST_INMEMORY=1 to run against an in-memory database instead of
+a file in the working directory.
+"""
+
+import os
 
 from danki.engine.db import Database
 
+IN_MEMORY = os.environ.get("DANKI_TEST_INMEMORY") == "1"
+DB_PATH = "file:test_add_cards?mode=memory&cache=shared" if IN_MEMORY else "test_add_cards.sqlite"
+
 def test_deck_creation_and_cards():
     """Test that we can create decks and add cards."""
     print("Testing deck creation and card addition...")
     
     # Initialize database
-    db = Database("test_add_cards.sqlite")
+    db = Database(DB_PATH)
     
     # Test 1: Create a deck
     print("\n1. Creating deck...")
@@ -87,8 +96,8 @@ def test_deck_creation_and_cards():
     
     # Cleanup
     db.close()
-    import os
-    os.remove("test_add_cards.sqlite")
+    if not IN_MEMORY:
+        os.remove(DB_PATH)
     print("✓ Cleaned up test database")
 
 if __name__ == "__main__":
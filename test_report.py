@@ -4,47 +4,93 @@ Comprehensive test report and analysis for SM-2 scheduler implementation.
 Runs all test suites and provides detailed analysis with recommendations.
 """
 
+import io
+import queue
+import re
 import subprocess
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-def run_test_suite(script_name, description):
-    """Run a test suite and return results."""
-    print(f"\n🚀 Running {description}...")
-    print("=" * 80)
+# Messages in suite output that the analysis reacts to
+FK_NOT_ENFORCED = "Foreign key constraint not enforced"
+OUTPUT_FLAGS = re.compile("|".join(map(re.escape, [FK_NOT_ENFORCED])))
+
+def run_test_suite(script_name, description, lines):
+    """Run a test suite and return results.
     
+    Stdout lines are put on the ``lines`` queue as they arrive, followed
+    by None once the suite has finished.
+    """
     try:
-        start_time = time.time()
-        result = subprocess.run(
+        start_time = time.perf_counter()
+        proc = subprocess.Popen(
             [sys.executable, script_name], 
-            capture_output=True, 
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
             text=True, 
+            bufsize=1,
             cwd=Path(__file__).parent
         )
-        duration = time.time() - start_time
         
-        print(result.stdout)
-        if result.stderr:
-            print("STDERR:", result.stderr)
+        # Drain stderr alongside stdout so neither pipe can fill up and block
+        stderr_chunks = []
+        stderr_reader = threading.Thread(target=lambda: stderr_chunks.append(proc.stderr.read()))
+        stderr_reader.start()
         
-        success = result.returncode == 0
+        stdout = io.StringIO()
+        for line in proc.stdout:
+            stdout.write(line)
+            lines.put(line)
+        stderr_reader.join()
+        returncode = proc.wait()
+        duration = time.perf_counter() - start_time
+        
+        success = returncode == 0
+        stdout = stdout.getvalue()
         return {
             'name': description,
+            'script': script_name,
             'success': success,
             'duration': duration,
-            'stdout': result.stdout,
-            'stderr': result.stderr
+            'stdout': stdout,
+            'stderr': "".join(stderr_chunks),
+            'flags': {m.group(0) for m in OUTPUT_FLAGS.finditer(stdout)},
+            'error': None
         }
     except Exception as e:
-        print(f"❌ Error running {script_name}: {e}")
         return {
             'name': description,
+            'script': script_name,
             'success': False,
             'duration': 0,
             'stdout': '',
-            'stderr': str(e)
+            'stderr': str(e),
+            'flags': set(),
+            'error': e
         }
+    finally:
+        lines.put(None)
+
+def print_suite_output(description, lines, future):
+    """Print a suite's output as it streams in, then any stderr or error."""
+    print(f"\n🚀 Running {description}...")
+    print("=" * 80)
+    
+    for line in iter(lines.get, None):
+        print(line, end="", flush=True)
+    
+    result = future.result()
+    if result['error'] is not None:
+        print(f"❌ Error running {result['script']}: {result['error']}")
+        return result
+    
+    print()
+    if result['stderr']:
+        print("STDERR:", result['stderr'])
+    return result
 
 def analyze_test_results(results):
     """Analyze test results and provide recommendations."""
@@ -105,7 +151,7 @@ def analyze_test_results(results):
             print("     - Review logging is accurate")
             print("     - Card state changes are consistent")
             print("     - Data persists correctly across sessions")
-            if "Foreign key constraint not enforced" in db_result['stdout']:
+            if FK_NOT_ENFORCED in db_result['flags']:
                 print("     ⚠️  Warning: Foreign key constraints not fully enforced")
         else:
             print("  ❌ Database Tests: Data integrity issues found")
@@ -141,7 +187,7 @@ def generate_recommendations(results, all_passed):
         
         # Check for warnings in database tests
         db_result = next((r for r in results if 'Database' in r['name']), None)
-        if db_result and "Foreign key constraint not enforced" in db_result['stdout']:
+        if db_result and FK_NOT_ENFORCED in db_result['flags']:
             print("     - Enable foreign key constraints in SQLite for better data integrity")
             print("       Add: PRAGMA foreign_keys = ON; after connecting")
         
@@ -188,13 +234,30 @@ def main():
         ("test_scheduler.py", "Unit Tests"),
         ("scheduler_simulator.py", "Integration Tests"),
         ("database_test.py", "Database Consistency Tests"),
+    ]
+    # Suites with wall-clock checks; they run alone, after the others
+    timing_suites = [
         ("performance_test.py", "Performance & Edge Case Tests"),
     ]
     
+    # Each suite runs in its own process on its own temp database, so start
+    # them all at once. Output is printed in the listed order: the suite
+    # being printed streams live, later ones queue up until their turn
     results = []
-    for script, description in test_suites:
-        result = run_test_suite(script, description)
-        results.append(result)
+    with ThreadPoolExecutor(max_workers=len(test_suites)) as ex:
+        line_queues = [queue.Queue() for _ in test_suites]
+        futures = [ex.submit(run_test_suite, script, description, lines)
+                   for (script, description), lines in zip(test_suites, line_queues)]
+        for (script, description), lines, future in zip(test_suites, line_queues, futures):
+            results.append(print_suite_output(description, lines, future))
+    
+    # Timing checks (e.g. build_time < 1s) are only meaningful when nothing
+    # else competes for the CPU, so these run one at a time
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        for script, description in timing_suites:
+            lines = queue.Queue()
+            future = ex.submit(run_test_suite, script, description, lines)
+            results.append(print_suite_output(description, lines, future))
     
     # Generate comprehensive analysis
     all_passed = analyze_test_results(results)
@@ -5,58 +5,60 @@ Tests core logic without database dependencies.
 """
 
 import sys
-import time
-import tempfile
-import os
-from pathlib import Path
-
-# Add the project root to Python path
-sys.path.insert(0, str(Path(__file__).parent))
+import math
 
 from danki.engine.scheduler import Scheduler, Rating
 
+# Fixed "current" time, so due times and lateness are deterministic
+NOW = 1_700_000_000
+# ±5% fuzz on a 1-day interval, in seconds
+FUZZ_SECONDS_1D = 0.05 * 24 * 3600
+
 
 class MockCard:
-    """Mock card for testing scheduler logic without database."""
+    """Mock card for testing scheduler logic without database.
+    
+    Fields live in slots rather than a per-card dict; item access
+    (``card['state']``) lets the card stand in for a database row.
+    """
+    
+    __slots__ = ('state', 'ease', 'interval_days', 'lapses', 'step_index', 'due_ts')
     
     def __init__(self, state='new', ease=2.5, interval_days=0, lapses=0, step_index=0):
-        self.data = {
-            'state': state,
-            'ease': ease,
-            'interval_days': interval_days,
-            'lapses': lapses,
-            'step_index': step_index,
-            'due_ts': int(time.time())  # Default to now
-        }
+        self.state = state
+        self.ease = ease
+        self.interval_days = interval_days
+        self.lapses = lapses
+        self.step_index = step_index
+        self.due_ts = NOW  # Due exactly at the test's now
     
     def __getitem__(self, key):
-        return self.data[key]
+        return getattr(self, key)
     
     def update(self, **kwargs):
-        self.data.update(kwargs)
+        for key, value in kwargs.items():
+            setattr(self, key, value)
 
 
 class SchedulerTester:
     """Test harness for SM-2 scheduler logic."""
     
+    # (display name, state, step_index, rating, expected state, expected due offset in seconds)
+    TRANSITIONS = [
+        # New cards start learning at step 0 (1 minute) whatever the rating
+        ("New card MISSED → learning", 'new', 0, Rating.AGAIN, 'learning', 1 * 60),
+        ("New card ALMOST → learning", 'new', 0, Rating.HARD, 'learning', 1 * 60),
+        ("New card GOT_IT → learning step 1", 'new', 0, Rating.GOOD, 'learning', 1 * 60),
+        # AGAIN resets to step 0 (1 min); HARD waits at least 10 min; GOOD advances
+        ("Learning step 0 MISSED → reset", 'learning', 0, Rating.AGAIN, 'learning', 1 * 60),
+        ("Learning step 0 ALMOST → stay", 'learning', 0, Rating.HARD, 'learning', 10 * 60),
+        ("Learning step 0 GOT_IT → advance", 'learning', 0, Rating.GOOD, 'learning', 10 * 60),
+        ("Learning step 1 MISSED → reset", 'learning', 1, Rating.AGAIN, 'learning', 1 * 60),
+        ("Learning step 1 ALMOST → stay", 'learning', 1, Rating.HARD, 'learning', 10 * 60),
+    ]
+    
     def __init__(self):
-        self.scheduler = None
         self.test_results = []
-        self.setup_temp_scheduler()
-    
-    def setup_temp_scheduler(self):
-        """Create temporary scheduler for testing."""
-        temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.sqlite')
-        temp_db.close()
-        self.temp_db_path = temp_db.name
-        self.scheduler = Scheduler(self.temp_db_path)
-    
-    def cleanup(self):
-        """Clean up temporary files."""
-        if self.scheduler:
-            self.scheduler.db.close()
-        if hasattr(self, 'temp_db_path') and os.path.exists(self.temp_db_path):
-            os.unlink(self.temp_db_path)
     
     def run_test(self, name, test_func):
         """Run a single test and record results."""
@@ -71,120 +73,58 @@ class SchedulerTester:
         print(result)
         return result
     
-    def assert_card_state(self, result, expected_state, expected_due_offset=None, expected_interval=None):
-        """Helper to validate card state transitions."""
+    def assert_card_state(self, result, expected_state, now, expected_due_offset=None, expected_interval=None):
+        """Helper to validate card state transitions.
+        
+        ``now`` is the timestamp the scheduler was given, so due times are
+        checked exactly.
+        """
         state, due_ts, interval, ease, lapses, step_index = result
         
         if state != expected_state:
             raise AssertionError(f"Expected state '{expected_state}', got '{state}'")
         
         if expected_due_offset is not None:
-            now = int(time.time())
             expected_due = now + expected_due_offset
-            if abs(due_ts - expected_due) > 60:  # Allow 1 minute tolerance
-                raise AssertionError(f"Expected due_ts ~{expected_due}, got {due_ts}")
+            if due_ts != expected_due:
+                raise AssertionError(f"Expected due_ts {expected_due}, got {due_ts}")
         
         if expected_interval is not None:
-            if abs(interval - expected_interval) > 0.1:
+            if not math.isclose(interval, expected_interval, abs_tol=0.1):
                 raise AssertionError(f"Expected interval {expected_interval}, got {interval}")
     
-    # NEW CARD TESTS
-    def test_new_card_missed(self):
-        """New card rated MISSED should go to learning step 0 (10 min)."""
-        card = MockCard(state='new')
-        now = int(time.time())
+    def check_transition(self, state, step_index, rating, expected_state, expected_due_offset):
+        """Rate a mock card once and check its state and due time (interval stays 0)."""
+        card = MockCard(state=state, step_index=step_index)
+        now = NOW
         
-        result = self.scheduler._calculate_next_state(card.data, Rating.AGAIN, now)
+        result = Scheduler._calculate_next_state(card, rating, now)
         
-        self.assert_card_state(result, 'learning', 1 * 60, 0)  # 1 minute
-    
-    def test_new_card_almost(self):
-        """New card rated ALMOST should go to learning step 0 (10 min)."""
-        card = MockCard(state='new')
-        now = int(time.time())
-        
-        result = self.scheduler._calculate_next_state(card.data, Rating.HARD, now)
-        
-        self.assert_card_state(result, 'learning', 1 * 60, 0)  # 1 minute
-    
-    def test_new_card_got_it(self):
-        """New card rated GOOD should start learning at step 0 (1 minute)."""
-        card = MockCard(state='new')
-        now = int(time.time())
-        
-        result = self.scheduler._calculate_next_state(card.data, Rating.GOOD, now)
-        
-        self.assert_card_state(result, 'learning', 1 * 60, 0)  # 1 minute
+        self.assert_card_state(result, expected_state, now, expected_due_offset, 0)
     
     # LEARNING CARD TESTS
-    def test_learning_step_0_missed(self):
-        """Learning step 0 rated AGAIN should reset to step 0 (1 min)."""
-        card = MockCard(state='learning', step_index=0)
-        now = int(time.time())
-        
-        result = self.scheduler._calculate_next_state(card.data, Rating.AGAIN, now)
-        
-        self.assert_card_state(result, 'learning', 1 * 60, 0)
-    
-    def test_learning_step_0_almost(self):
-        """Learning step 0 rated HARD should stay at step 0 (10 min minimum)."""
-        card = MockCard(state='learning', step_index=0)
-        now = int(time.time())
-        
-        result = self.scheduler._calculate_next_state(card.data, Rating.HARD, now)
-        
-        self.assert_card_state(result, 'learning', 10 * 60, 0)
-    
-    def test_learning_step_0_got_it(self):
-        """Learning step 0 rated GOT_IT should advance to step 1 (1 day)."""
-        card = MockCard(state='learning', step_index=0)
-        now = int(time.time())
-        
-        result = self.scheduler._calculate_next_state(card.data, Rating.GOOD, now)
-        
-        self.assert_card_state(result, 'learning', 10 * 60, 0)
-    
-    def test_learning_step_1_missed(self):
-        """Learning step 1 rated AGAIN should reset to step 0 (1 min)."""
-        card = MockCard(state='learning', step_index=1)
-        now = int(time.time())
-        
-        result = self.scheduler._calculate_next_state(card.data, Rating.AGAIN, now)
-        
-        self.assert_card_state(result, 'learning', 1 * 60, 0)
-    
-    def test_learning_step_1_almost(self):
-        """Learning step 1 rated ALMOST should stay at step 1 (1 day)."""
-        card = MockCard(state='learning', step_index=1)
-        now = int(time.time())
-        
-        result = self.scheduler._calculate_next_state(card.data, Rating.HARD, now)
-        
-        self.assert_card_state(result, 'learning', 10 * 60, 0)
-    
     def test_learning_graduation(self):
         """Learning step 1 rated GOT_IT should graduate to review (1 day)."""
         card = MockCard(state='learning', step_index=1)
-        now = int(time.time())
+        now = NOW
         
-        result = self.scheduler._calculate_next_state(card.data, Rating.GOOD, now)
+        result = Scheduler._calculate_next_state(card, Rating.GOOD, now)
         
         # With fuzzing, graduation interval ~1 day (±5%)
         state, due_ts, interval, ease, lapses, step_index = result
-        now = int(time.time())
         expected_due = now + (24 * 3600)  # 1 day
         
         assert state == 'review', f"Expected 'review', got '{state}'"
         assert 0.95 <= interval <= 1.05, f"Expected interval ~1.0 (±5%), got {interval}"
-        assert abs(due_ts - expected_due) <= (0.05 * 24 * 3600), f"Due time within fuzzing range"
+        assert -FUZZ_SECONDS_1D <= due_ts - expected_due <= FUZZ_SECONDS_1D, f"Due time within fuzzing range"
     
     # REVIEW CARD TESTS
     def test_review_missed_lapse(self):
         """Review card rated MISSED should lapse back to learning."""
         card = MockCard(state='review', ease=2.5, interval_days=5.0)
-        now = int(time.time())
+        now = NOW
         
-        result = self.scheduler._calculate_next_state(card.data, Rating.AGAIN, now)
+        result = Scheduler._calculate_next_state(card, Rating.AGAIN, now)
         
         state, due_ts, interval, ease, lapses, step_index = result
         
@@ -196,9 +136,9 @@ class SchedulerTester:
     def test_review_almost_hard(self):
         """Review card rated ALMOST should reduce ease and increase interval by 1.2x."""
         card = MockCard(state='review', ease=2.5, interval_days=5.0)
-        now = int(time.time())
+        now = NOW
         
-        result = self.scheduler._calculate_next_state(card.data, Rating.HARD, now)
+        result = Scheduler._calculate_next_state(card, Rating.HARD, now)
         
         state, due_ts, interval, ease, lapses, step_index = result
         
@@ -211,9 +151,9 @@ class SchedulerTester:
     def test_review_got_it_good(self):
         """Review card rated GOT_IT should maintain ease and multiply by ease factor."""
         card = MockCard(state='review', ease=2.5, interval_days=5.0)
-        now = int(time.time())
+        now = NOW
         
-        result = self.scheduler._calculate_next_state(card.data, Rating.GOOD, now)
+        result = Scheduler._calculate_next_state(card, Rating.GOOD, now)
         
         state, due_ts, interval, ease, lapses, step_index = result
         
@@ -226,10 +166,10 @@ class SchedulerTester:
     def test_ease_floor_enforcement(self):
         """Ease should never go below 1.3."""
         card = MockCard(state='review', ease=1.35, interval_days=2.0)  # Close to floor
-        now = int(time.time())
+        now = NOW
         
         # Multiple missed reviews should not push ease below 1.3
-        result = self.scheduler._calculate_next_state(card.data, Rating.AGAIN, now)
+        result = Scheduler._calculate_next_state(card, Rating.AGAIN, now)
         state, due_ts, interval, ease, lapses, step_index = result
         
         assert ease >= 1.3, f"Expected ease >= 1.3, got {ease}"
@@ -237,9 +177,9 @@ class SchedulerTester:
     def test_interval_minimum(self):
         """Intervals should have reasonable minimums."""
         card = MockCard(state='review', ease=1.3, interval_days=0.5)
-        now = int(time.time())
+        now = NOW
         
-        result = self.scheduler._calculate_next_state(card.data, Rating.HARD, now)
+        result = Scheduler._calculate_next_state(card, Rating.HARD, now)
         state, due_ts, interval, ease, lapses, step_index = result
         
         assert interval >= 1.0, f"Expected interval >= 1.0, got {interval}"
@@ -249,17 +189,9 @@ class SchedulerTester:
         print("🧪 Running SM-2 Scheduler Unit Tests")
         print("=" * 50)
         
-        # New card tests
-        self.run_test("New card MISSED → learning", self.test_new_card_missed)
-        self.run_test("New card ALMOST → learning", self.test_new_card_almost)
-        self.run_test("New card GOT_IT → learning step 1", self.test_new_card_got_it)
-        
-        # Learning tests
-        self.run_test("Learning step 0 MISSED → reset", self.test_learning_step_0_missed)
-        self.run_test("Learning step 0 ALMOST → stay", self.test_learning_step_0_almost)
-        self.run_test("Learning step 0 GOT_IT → advance", self.test_learning_step_0_got_it)
-        self.run_test("Learning step 1 MISSED → reset", self.test_learning_step_1_missed)
-        self.run_test("Learning step 1 ALMOST → stay", self.test_learning_step_1_almost)
+        # New card and learning step transitions
+        for name, *case in self.TRANSITIONS:
+            self.run_test(name, lambda case=case: self.check_transition(*case))
         self.run_test("Learning graduation", self.test_learning_graduation)
         
         # Review tests
@@ -291,12 +223,8 @@ class SchedulerTester:
 def main():
     """Run the test suite."""
     tester = SchedulerTester()
-    
-    try:
-        passed, failed, results = tester.run_all_tests()
-        return failed == 0  # Return True if all tests passed
-    finally:
-        tester.cleanup()
+    passed, failed, results = tester.run_all_tests()
+    return failed == 0  # Return True if all tests passed
 
 
 if __name__ == "__main__":
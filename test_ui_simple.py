@@ -1,8 +1,44 @@
 #!/usr/bin/env python3
 """Simple test to check if Add Cards processing works."""
 
+import os
+import time
+
 from danki.engine.db import Database
 
+
+def mock_for(word):
+    """Mock Gemini response for a word (what GeminiWorker.query_gemini_api returns)."""
+    if word.endswith(("en", "ern", "eln")):
+        # Verb
+        return {
+            "base_d": word,
+            "base_e": f"[translation of {word}]",
+            "word_type": "verb",
+            "artikel_d": "",
+            "plural_d": "",
+            "conjugation": {
+                "ich": word[:-2] + "e",
+                "du": word[:-2] + "st", 
+                "er_sie_es": word[:-2] + "t",
+                "wir": word,
+                "ihr": word[:-2] + "t",
+                "sie_Sie": word
+            },
+            "s1": f"Ich {word} jeden Tag.",
+            "s1e": f"I {word[:-2]} every day."
+        }
+    # Noun
+    return {
+        "base_d": word,
+        "base_e": f"[translation of {word}]",
+        "artikel_d": "der" if word.endswith("er") else "die" if word.endswith("e") else "das",
+        "word_type": "noun",
+        "s1": f"Das ist {word}.",
+        "s1e": f"This is {word}.",
+    }
+
+
 def test_ui_integration():
     """Test the integration path that the UI would use."""
     print("Testing UI integration path...")
@@ -35,36 +71,7 @@ def test_ui_integration():
     
     success_count = 0
     for word in words:
-        # Mock Gemini response (this is what's in GeminiWorker.query_gemini_api)
-        if word.endswith(("en", "ern", "eln")):
-            # Verb
-            mock_data = {
-                "base_d": word,
-                "base_e": f"[translation of {word}]",
-                "word_type": "verb",
-                "artikel_d": "",
-                "plural_d": "",
-                "conjugation": {
-                    "ich": word[:-2] + "e",
-                    "du": word[:-2] + "st", 
-                    "er_sie_es": word[:-2] + "t",
-                    "wir": word,
-                    "ihr": word[:-2] + "t",
-                    "sie_Sie": word
-                },
-                "s1": f"Ich {word} jeden Tag.",
-                "s1e": f"I {word[:-2]} every day."
-            }
-        else:
-            # Noun
-            mock_data = {
-                "base_d": word,
-                "base_e": f"[translation of {word}]",
-                "artikel_d": "der" if word.endswith("er") else "die" if word.endswith("e") else "das",
-                "word_type": "noun",
-                "s1": f"Das ist {word}.",
-                "s1e": f"This is {word}.",
-            }
+        mock_data = mock_for(word)
         
         # Add to database (like AddCardsScreen.on_word_processed does)
         try:
@@ -82,13 +89,11 @@ def test_ui_integration():
     print(f"\\n✅ Successfully processed {success_count}/{len(words)} words")
     
     # Step 4: Verify cards are in database
-    import time
     cards = db.get_cards_for_review([deck_id], int(time.time()))
     print(f"✓ Found {len(cards)} cards in database ready for review")
     
     # Cleanup
     db.close()
-    import os
     os.remove("test_ui.sqlite")
     print("✓ Test complete")
 
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Shared setup for the standalone scheduler test scripts.
+"""
+
+import sys
+import io
+import contextlib
+
+from danki.engine.scheduler import Scheduler
+from danki.engine.db import Database
+
+
+@contextlib.contextmanager
+def fresh_db():
+    """Yield (scheduler, db) on a throwaway in-memory database.
+
+    The scheduler shares the Database's connection, which is closed
+    once on exit.
+    """
+    db = Database(":memory:")
+    try:
+        yield Scheduler(db=db), db
+    finally:
+        db.close()
+
+
+def run_buffered(test):
+    """Run a test with its output collected, then written in a single call.
+
+    The output is written even if the test raises, so a traceback keeps
+    the progress lines that lead up to it.
+    """
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            return test()
+    finally:
+        sys.stdout.write(output.getvalue())
+
+
+def print_exc():
+    """Print the current exception's traceback.
+
+    traceback is imported here rather than at module level, so runs where
+    every test passes never load it.
+    """
+    import traceback
+    traceback.print_exc()